@@ -0,0 +1,183 @@
+# benchmark.py
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+# Benchmark without a window; must be set before pygame initializes its display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from constants import Constants
+from visualization_app import VisualizationApp
+
+# Every sweep varies one parameter of the base case
+BASE_CASE = {'arms': 10, 'trace_length': 100_000, 'speed_multiplier': 1.0, 'scale': 1.0, 'joints': 0}
+SWEEPS = {
+    'arms': [2, 10, 100, 1000],
+    'trace_length': [1_000, 100_000, 1_000_000, 10_000_000],
+    'speed_multiplier': [0.1, 1.0, 10.0, 100.0],
+    'scale': [0.1, 1.0, 5.0],
+    'joints': [0, 1, 9],
+}
+QUICK_SWEEPS = {
+    'arms': [2, 100],
+    'trace_length': [1_000, 100_000],
+    'speed_multiplier': [1.0, 10.0],
+    'scale': [0.1, 5.0],
+    'joints': [0, 9],
+}
+PHASES = ('update', 'draw', 'redraw')
+
+def build_cases(sweeps):
+    cases = []
+    seen = set()
+    for name, values in sweeps.items():
+        for value in values:
+            params = dict(BASE_CASE, **{name: value})
+            params['joints'] = min(params['joints'], params['arms'] - 1)
+            key = tuple(sorted(params.items()))
+            if key in seen:
+                continue
+            seen.add(key)
+            cases.append(params)
+    return cases
+
+def case_name(params):
+    return ",".join(f"{key}={params[key]}" for key in sorted(params))
+
+def build_app(screen, params):
+    arms = params['arms']
+    # Decreasing lengths and incommensurate speeds, so the curve never closes
+    lengths = [150.0 / (i + 1) for i in range(arms)]
+    speeds = [0.05 * (i + 1) * (-1) ** i * (1 + np.sqrt(2) / 100) for i in range(arms)]
+    joints = [(i < params['joints'], '#FF0000') for i in range(arms - 1)]
+
+    app = VisualizationApp(screen)
+    app.trace_capacity = max(params['trace_length'], 1)
+    app.load_configuration(lengths, speeds, joints)
+    app.period = None  # Keep tracing for the whole benchmark
+    app.speed_multiplier = params['speed_multiplier']
+    app.scale = params['scale']
+
+    # Prefill the sample times instead of running frames; the traces are computed when drawn
+    max_delta_time = app.engine.max_delta_time(app.max_pixel_error, app.scale, 1.0)
+    app.trace_times.extend((np.arange(params['trace_length']) + 1) * max_delta_time)
+    app.time = params['trace_length'] * max_delta_time
+    app.draw_visualization_screen()  # Warm the trace cache
+    return app
+
+def discard_trace_caches(app):
+    # A redraw from scratch: no cached tiles and no simplified zoom levels to reuse
+    app.trace_canvas.reset()
+    app.trace_canvas.simplifier.levels.clear()
+
+def time_calls(function, repeats, before=None):
+    samples = []
+    for _ in range(repeats):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def summarize(samples):
+    ms = np.asarray(samples) * 1000
+    return {
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p90_ms': float(np.percentile(ms, 90)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+    }
+
+def run_case(screen, params, repeats):
+    app = build_app(screen, params)
+    result = {'name': case_name(params), 'params': params}
+    result['update'] = summarize(time_calls(app.update_visualization, repeats))
+    result['draw'] = summarize(time_calls(app.draw_visualization_screen, repeats))
+    result['redraw'] = summarize(time_calls(app.draw_visualization_screen, max(repeats // 5, 3),
+                                            before=lambda: discard_trace_caches(app)))
+
+    # Memory is traced in a separate pass since tracemalloc slows allocations down
+    del app
+    tracemalloc.start()
+    app = build_app(screen, params)
+    app.update_visualization()
+    discard_trace_caches(app)
+    app.draw_visualization_screen()
+    result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result
+
+def compare(results, baseline, threshold):
+    # Returns a message per phase whose median latency grew by more than threshold
+    baseline_cases = {case['name']: case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        reference = baseline_cases.get(case['name'])
+        if reference is None:
+            continue
+        for phase in PHASES:
+            old = reference[phase]['p50_ms']
+            new = case[phase]['p50_ms']
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append(f"{case['name']} {phase}: {old:.3f} ms -> {new:.3f} ms (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation and render hot paths without a window.")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="Where to write the JSON results")
+    parser.add_argument('-r', '--repeats', type=int, default=50, help="Timed calls per phase and case")
+    parser.add_argument('--quick', action='store_true', help="Run a smaller sweep")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Allowed relative growth of the median latency before failing")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    pygame.init()
+    screen = pygame.display.set_mode((Constants.WIDTH, Constants.HEIGHT))
+
+    cases = build_cases(QUICK_SWEEPS if args.quick else SWEEPS)
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'machine': platform.machine(),
+            'repeats': args.repeats,
+        },
+        'cases': [],
+    }
+    for params in cases:
+        result = run_case(screen, params, args.repeats)
+        results['cases'].append(result)
+        print(f"{result['name']}: " + ", ".join(
+            f"{phase} p50 {result[phase]['p50_ms']:.3f} ms / p99 {result[phase]['p99_ms']:.3f} ms" for phase in PHASES
+        ) + f", peak {result['peak_memory_bytes'] / 2 ** 20:.1f} MiB", file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    pygame.quit()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@
 
 import pygame
 from constants import Constants
+from text_cache import get_font, render_text
 
 class Button:
     def __init__(self, x, y, w, h, text, callback, color=Constants.GRAY, hover_color=Constants.LIGHT_BLUE):
@@ -10,17 +11,26 @@ class Button:
         self.hover_color = hover_color
         self.text = text
         self.callback = callback
-        self.font = pygame.font.SysFont(None, Constants.BUTTON_FONT_SIZE)
-        self.txt_surface = self.font.render(text, True, Constants.BLACK)
+        self.font = get_font(Constants.BUTTON_FONT_SIZE)
+        self.txt_surface = render_text(text, Constants.BUTTON_FONT_SIZE, Constants.BLACK)
+        self.hovered = self.rect.collidepoint(pygame.mouse.get_pos())
+        self.dirty = True  # Whether the button needs to be drawn again
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.rect.collidepoint(event.pos):
                 self.callback()
+        elif event.type == pygame.MOUSEMOTION:
+            hovered = self.rect.collidepoint(event.pos)
+            if hovered != self.hovered:
+                self.hovered = hovered
+                self.dirty = True
+
+    def get_bounds(self):
+        return self.rect.copy()
 
     def draw(self, screen):
-        mouse_pos = pygame.mouse.get_pos()
-        if self.rect.collidepoint(mouse_pos):
+        if self.hovered:
             pygame.draw.rect(screen, self.hover_color, self.rect)
         else:
             pygame.draw.rect(screen, self.color, self.rect)
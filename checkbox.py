@@ -7,11 +7,17 @@ class CheckBox:
     def __init__(self, x, y, size=20, checked=False):
         self.rect = pygame.Rect(x, y, size, size)
         self.checked = checked
+        self.dirty = True  # Whether the checkbox needs to be drawn again
 
     def handle_event(self, event):
         if event.type == pygame.MOUSEBUTTONDOWN:
             if self.rect.collidepoint(event.pos):
                 self.checked = not self.checked
+                self.dirty = True
+
+    def get_bounds(self):
+        # The checkmark lines are drawn 2 pixels wide and overhang the corners
+        return self.rect.inflate(4, 4)
 
     def draw(self, screen):
         pygame.draw.rect(screen, Constants.WHITE, self.rect, 2)
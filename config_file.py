@@ -0,0 +1,157 @@
+# config_file.py
+
+import csv
+import json
+import math
+import numpy as np
+from input_box import parse_color
+
+# JSON: {"lengths": [...], "speeds": [...], "phases": [...],
+#        "joints": [{"enabled": true, "color": "#FF0000"}, ...]}
+# CSV: one row per line with the columns below. Phases and joints are optional in both;
+# joint k sits at the end of line k, so the joint columns of the last row are ignored.
+# A joint without an enabled value is not traced, in either format.
+CSV_FIELDS = ['length', 'speed', 'phase', 'joint_enabled', 'joint_color']
+MAX_REPORTED_ERRORS = 20
+
+class ConfigError(ValueError):
+    def __init__(self, path, errors):
+        # errors holds one message per invalid row
+        self.errors = errors
+        shown = errors[:MAX_REPORTED_ERRORS]
+        if len(errors) > len(shown):
+            shown.append(f"... and {len(errors) - len(shown)} more")
+        super().__init__(f"{path}: " + "; ".join(shown))
+
+def parse_enabled(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'on'):
+        return True
+    if text in ('', '0', 'false', 'no', 'off'):
+        return False
+    return None
+
+def to_floats(values):
+    # Fast path for a list of plain numbers; None if any needs a closer look
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 1 or not np.all(np.isfinite(array)):
+        return None
+    return array
+
+def check_numbers(values, name, errors, positive=False):
+    # Returns the values as floats, adding a message per invalid row to errors
+    array = to_floats(values)
+    if array is None:
+        array = np.full(len(values), np.nan)
+        for row, value in enumerate(values):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                errors.append(f"row {row + 1}: {name} {value!r} is not a number")
+                continue
+            if not math.isfinite(number):
+                errors.append(f"row {row + 1}: {name} {value!r} is not finite")
+                continue
+            array[row] = number
+    if positive:
+        for row in np.flatnonzero(array <= 0).tolist():
+            errors.append(f"row {row + 1}: {name} {values[row]!r} must be positive")
+    return array.tolist()
+
+def check_config(path, lengths, speeds, phases, joints):
+    # joints is a list of (enabled, color) per joint; raises ConfigError listing every invalid row
+    errors = []
+    if not lengths:
+        errors.append("no lines")
+    if len(speeds) != len(lengths):
+        errors.append(f"{len(lengths)} lengths but {len(speeds)} speeds")
+    if phases is not None and len(phases) != len(lengths):
+        errors.append(f"{len(lengths)} lengths but {len(phases)} phases")
+    if errors:
+        raise ConfigError(path, errors)
+
+    lengths = check_numbers(lengths, 'length', errors, positive=True)
+    speeds = check_numbers(speeds, 'speed', errors)
+    phases = check_numbers(phases, 'phase', errors) if phases is not None else [0.0] * len(lengths)
+    checked_joints = []
+    colors = {}  # Joints mostly share a few colours, so each is only parsed once
+    for row, (enabled, color) in enumerate(joints[:len(lengths) - 1]):
+        parsed = parse_enabled(enabled)
+        if parsed is None:
+            errors.append(f"row {row + 1}: joint_enabled {enabled!r} is not a boolean")
+        color = str(color)
+        if color not in colors:
+            colors[color] = parse_color(color)
+        if colors[color] is None:
+            errors.append(f"row {row + 1}: joint_color {color!r} is not a #RRGGBB colour")
+        checked_joints.append((bool(parsed), color))
+    if errors:
+        raise ConfigError(path, errors)
+    return lengths, speeds, phases, checked_joints
+
+def load_config(path):
+    # Returns (lengths, speeds, phases, joints) with joints as (enabled, color) pairs;
+    # a .csv path is read as CSV, anything else as JSON
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            try:
+                rows = list(csv.DictReader(f))
+            except (csv.Error, UnicodeDecodeError) as error:
+                raise ConfigError(path, [str(error)]) from None
+        if rows and ('length' not in rows[0] or 'speed' not in rows[0]):
+            raise ConfigError(path, ["the header needs at least the length and speed columns"])
+        lengths = [row['length'] for row in rows]
+        speeds = [row['speed'] for row in rows]
+        phases = [row['phase'] or 0 for row in rows] if rows and 'phase' in rows[0] else None
+        joints = [(row.get('joint_enabled') or False, row.get('joint_color') or '#FF0000') for row in rows[:-1]]
+    else:
+        with open(path) as f:
+            try:
+                config = json.load(f)
+            except (json.JSONDecodeError, UnicodeDecodeError) as error:
+                raise ConfigError(path, [str(error)]) from None
+        if not isinstance(config, dict) or 'lengths' not in config or 'speeds' not in config:
+            raise ConfigError(path, ["expected an object with lengths and speeds"])
+        # Valid JSON can still have the wrong structure; report it like any other invalid row
+        errors = [f"{name} must be a list" for name in ('lengths', 'speeds', 'phases', 'joints')
+                  if config.get(name) is not None and not isinstance(config[name], list)]
+        if errors:
+            raise ConfigError(path, errors)
+        lengths = config['lengths']
+        speeds = config['speeds']
+        phases = config.get('phases')
+        joints = []
+        for row, joint in enumerate(config.get('joints') or []):
+            if not isinstance(joint, dict):
+                errors.append(f"row {row + 1}: joint {joint!r} is not an object")
+                continue
+            # A joint is only traced if it says so, as with an empty joint_enabled cell in CSV
+            joints.append((joint.get('enabled', False), joint.get('color', '#FF0000')))
+        if errors:
+            raise ConfigError(path, errors)
+    return check_config(path, lengths, speeds, phases, joints)
+
+def save_config(path, lengths, speeds, phases, joints):
+    # Writes the format load_config reads, chosen by the extension in the same way
+    if path.lower().endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for row, (length, speed, phase) in enumerate(zip(lengths, speeds, phases)):
+                enabled, color = joints[row] if row < len(joints) else (False, '')
+                writer.writerow([repr(float(length)), repr(float(speed)), repr(float(phase)),
+                                 'true' if enabled else 'false', color])
+    else:
+        config = {
+            'lengths': [float(length) for length in lengths],
+            'speeds': [float(speed) for speed in speeds],
+            'phases': [float(phase) for phase in phases],
+            'joints': [{'enabled': bool(enabled), 'color': color} for enabled, color in joints],
+        }
+        with open(path, 'w') as f:
+            json.dump(config, f)
@@ -23,6 +23,43 @@ class Constants:
     # Frame rate
     FPS = 60
 
+    # Simulation ticks per second when the simulation runs on a background thread
+    SIMULATION_RATE = 60
+
+    # Maximum number of points kept per trace (oldest points are dropped first)
+    TRACE_CAPACITY = 1_000_000
+
+    # Points per bounding box in the spatial index of a trace
+    TRACE_CHUNK_SIZE = 16
+
+    # Raster cache of the trace used when zooming and panning
+    TILE_SIZE = 256  # Pixels per tile side
+    TILE_CACHE_BYTES = 64 * 2 ** 20  # Memory budget for cached tiles
+
+    # Copies of the trace surface kept for playing backwards, and the samples between them
+    TRACE_CHECKPOINTS = 8
+    TRACE_CHECKPOINT_INTERVAL = 4096
+
+    # Chunks of new trace points the exporter may hold before the writer catches up
+    EXPORT_QUEUE_SIZE = 256
+
+    # Fraction of its brightness a fading trail keeps per frame
+    TRAIL_DECAY = 0.97
+
+    # Screen-space error (in pixels) allowed when simplifying traces for drawing
+    LOD_TOLERANCE = 0.5
+
+    # Arms shorter than this on screen (in pixels) are merged into their neighbours
+    MIN_ARM_PIXELS = 1.0
+
+    # Trace colours of compared systems, in order (the first system uses DRAW_COLOR)
+    SYSTEM_COLORS = [(255, 170, 80), (120, 200, 255), (150, 255, 150), (255, 120, 200),
+                     (255, 255, 120), (180, 140, 255), (120, 255, 230)]
+
+    # Layouts of compared systems
+    GRID_LAYOUT = 'grid'
+    OVERLAY_LAYOUT = 'overlay'
+
     # Application States
     INPUT_MODE = 'input'
     VISUALIZE_MODE = 'visualize'
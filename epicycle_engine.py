@@ -0,0 +1,148 @@
+# epicycle_engine.py
+
+import math
+from fractions import Fraction
+import numpy as np
+
+class EpicycleEngine:
+    def __init__(self, lengths, speeds, phases=None):
+        self.set_config(lengths, speeds, phases)
+
+    def set_config(self, lengths, speeds, phases=None):
+        # phases are the starting angles of the arms in radians, all zero by default
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.speeds = np.asarray(speeds, dtype=np.float64)
+        self.phases = np.zeros(len(self.lengths)) if phases is None else np.asarray(phases, dtype=np.float64)
+        self.amplitudes = self.lengths * np.exp(1j * self.phases)  # Arms at t = 0
+
+    @property
+    def arm_count(self):
+        return len(self.lengths)
+
+    def positions(self, times):
+        # Returns a (len(times), arm_count + 1) complex array; column 0 is the origin,
+        # column i + 1 is the end of arm i (x = real part, y = imaginary part)
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        result = np.zeros((len(times), self.arm_count + 1), dtype=np.complex128)
+        if self.arm_count:
+            # Each arm is a phasor length * e^(i * (speed * t + phase)); joints are their running sum
+            phasors = self.amplitudes * np.exp(1j * np.outer(times, self.speeds))
+            np.cumsum(phasors, axis=1, out=result[:, 1:])
+        return result
+
+    def positions_at(self, time):
+        return self.positions((time,))[0]
+
+    def column_positions(self, times, column, max_elements=2 ** 20):
+        # Returns column (as numbered by positions) at each time as a 1-D complex array.
+        # Only the arms before it are summed, a block of times at a time, so memory stays
+        # bounded for long ranges and many arms.
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        result = np.zeros(len(times), dtype=np.complex128)
+        if column <= 0:
+            return result
+        amplitudes = self.amplitudes[:column]
+        speeds = self.speeds[:column]
+        block = max(max_elements // column, 1)
+        for start in range(0, len(times), block):
+            phasors = np.exp(1j * np.outer(times[start:start + block], speeds))
+            result[start:start + block] = phasors @ amplitudes
+        return result
+
+    def period(self, tolerance=1e-9, max_denominator=10**6, max_period=1e7):
+        # Arms of zero length do not move the curve, so their speeds do not count
+        return common_period(self.speeds[self.lengths != 0], tolerance, max_denominator, max_period)
+
+    def max_delta_time(self, max_pixel_error, scale, total_delta_time):
+        # Largest time step whose chords stay within max_pixel_error of the traced curve.
+        # A chord over a step h deviates from the arc by at most h^2 / 8 * max|z''|, and
+        # |z''| <= sum(length * speed^2) for the endpoint and every joint.
+        curvature = float(np.sum(np.abs(self.lengths) * self.speeds ** 2)) * scale
+        if curvature > 0 and max_pixel_error > 0:
+            return math.sqrt(8 * max_pixel_error / curvature)
+        return total_delta_time  # No need to sub-step if nothing moves
+
+class EpicycleBatch:
+    def __init__(self, engines):
+        # Independent systems evaluated together. Systems with fewer arms are padded with
+        # zero-length arms, which leave their joints and endpoint where they are.
+        self.engines = list(engines)
+        arms = max((engine.arm_count for engine in self.engines), default=0)
+        self.amplitudes = np.zeros((len(self.engines), arms), dtype=np.complex128)
+        self.speeds = np.zeros((len(self.engines), arms), dtype=np.float64)
+        for number, engine in enumerate(self.engines):
+            self.amplitudes[number, :engine.arm_count] = engine.amplitudes
+            self.speeds[number, :engine.arm_count] = engine.speeds
+
+    @property
+    def system_count(self):
+        return len(self.engines)
+
+    def positions_at(self, time):
+        # Returns a (system_count, arms + 1) complex array laid out like EpicycleEngine.positions
+        result = np.zeros((self.system_count, self.amplitudes.shape[1] + 1), dtype=np.complex128)
+        np.cumsum(self.amplitudes * np.exp(1j * self.speeds * time), axis=1, out=result[:, 1:])
+        return result
+
+    def endpoints(self, times, max_elements=2 ** 20):
+        # Returns a (len(times), system_count) complex array of the endpoint of every system,
+        # evaluated a block of times at a time like EpicycleEngine.column_positions
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        result = np.zeros((len(times), self.system_count), dtype=np.complex128)
+        block = max(max_elements // max(self.amplitudes.size, 1), 1)
+        for start in range(0, len(times), block):
+            phasors = np.exp(1j * times[start:start + block, None, None] * self.speeds)
+            result[start:start + block] = np.einsum('tka,ka->tk', phasors, self.amplitudes)
+        return result
+
+    def max_delta_time(self, max_pixel_error, scale, total_delta_time):
+        # The systems share their sample times, so the finest system sets the step
+        return min((engine.max_delta_time(max_pixel_error, scale, total_delta_time) for engine in self.engines),
+                   default=total_delta_time)
+
+    def period(self, tolerance=1e-9, max_denominator=10**6, max_period=1e7):
+        # All systems are back where they started after the common period of all their arms
+        speeds = [engine.speeds[engine.lengths != 0] for engine in self.engines]
+        return common_period(np.concatenate(speeds) if speeds else [], tolerance, max_denominator, max_period)
+
+def common_period(speeds, tolerance=1e-9, max_denominator=10**6, max_period=1e7):
+    # Smallest T > 0 with speed * T a multiple of 2*pi for every speed, or None if there is
+    # none within max_period. Every float is within about 1e-12 of a fraction with a
+    # denominator up to 10**6, so tolerance only absorbs rounding noise: irrational speed
+    # ratios get a (long) period too, and max_period is what actually rejects them.
+    remaining = np.unique(np.abs(np.asarray(speeds, dtype=np.float64)))
+    remaining = remaining[remaining != 0]  # A still arm never breaks periodicity
+    if len(remaining) == 0:
+        return 0.0  # Nothing moves, the curve is a single point
+    frequency = None  # gcd of the speeds so far, as a Fraction
+    while len(remaining):
+        speed = float(remaining[0])
+        fraction = Fraction(speed).limit_denominator(max_denominator)
+        if abs(float(fraction) - speed) > tolerance * max(1.0, speed):
+            return None
+        if frequency is None:
+            frequency = fraction
+        else:
+            # gcd of fractions: gcd of the numerators over lcm of the denominators
+            denominator = (frequency.denominator * fraction.denominator //
+                           math.gcd(frequency.denominator, fraction.denominator))
+            frequency = Fraction(math.gcd(frequency.numerator * (denominator // frequency.denominator),
+                                          fraction.numerator * (denominator // fraction.denominator)), denominator)
+        # The period only grows as speeds are added, so give up as soon as it is too long
+        if 2 * math.pi / frequency > max_period:
+            return None
+        # Speeds that are already whole multiples of the frequency leave it unchanged
+        multiples = np.round(remaining / float(frequency)) * float(frequency)
+        remaining = remaining[np.abs(remaining - multiples) > tolerance * np.maximum(1.0, remaining)]
+    return 2 * math.pi / frequency
+
+def substep_times(start_time, total_delta_time, max_delta_time, max_steps=None):
+    # Sample times of each sub-step for a frame, ending exactly at start_time + total_delta_time
+    if total_delta_time <= 0 or max_delta_time <= 0:
+        return np.empty(0, dtype=np.float64)
+    steps = max(int(math.ceil(total_delta_time / max_delta_time)), 1)
+    if max_steps is not None and steps > max_steps:
+        steps = max_steps
+        max_delta_time = total_delta_time / steps
+    offsets = np.minimum(np.arange(1, steps + 1) * max_delta_time, total_delta_time)
+    return start_time + offsets
@@ -0,0 +1,68 @@
+# fading_trail.py
+
+import time
+import numpy as np
+import pygame
+from constants import Constants
+
+class FadingTrail:
+    def __init__(self, size, decay=Constants.TRAIL_DECAY):
+        # New segments are drawn onto an accumulation surface that is darkened once per
+        # frame, so older segments fade out without any point history being kept and each
+        # frame costs the same however long the trail has been running
+        self.surface = pygame.Surface(size)
+        # Blending whole surfaces is several times faster than blending with fill
+        level = round(255 * decay)
+        self.fade = pygame.Surface(size)
+        self.fade.fill((level, level, level))
+        self.floor = pygame.Surface(size)
+        self.floor.fill((1, 1, 1))
+        self.pending = {}  # Points added since the last update, per layer key
+        self.last_points = {}  # Last point drawn per layer key, so new segments join up
+        self.projection = None  # (scale, origin) the surface was drawn with
+        self.profiler = None  # Optional FrameProfiler timing projection and aalines
+        self.clear()
+
+    def clear(self):
+        self.surface.fill(Constants.BLACK)
+        self.pending = {}
+        self.last_points = {}
+
+    def add(self, key, points):
+        # points is an (n, 2) array of new trace points of one layer, oldest-first
+        if len(points):
+            self.pending.setdefault(key, []).append(points)
+
+    def update(self, layers, to_screen, scale, origin):
+        # layers is a list of (key, color); to_screen projects an (n, 2) array to screen points.
+        # The surface was drawn for one projection only, so a zoom or pan starts it over.
+        if (scale, origin) != self.projection:
+            self.clear()
+            self.projection = (scale, origin)
+
+        # One multiply over the whole surface fades it; the multiply rounds up, so a
+        # subtraction makes sure dim pixels reach black
+        self.surface.blit(self.fade, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+        self.surface.blit(self.floor, (0, 0), special_flags=pygame.BLEND_RGB_SUB)
+
+        for key, color in layers:
+            batches = self.pending.pop(key, [])
+            if key in self.last_points:
+                batches.insert(0, self.last_points[key])
+            if not batches:
+                continue
+            points = batches[0] if len(batches) == 1 else np.concatenate(batches)
+            self.last_points[key] = points[-1:]
+            if len(points) < 2:
+                continue
+            start = time.perf_counter()
+            screen_points = to_screen(points)
+            projected = time.perf_counter()
+            pygame.draw.aalines(self.surface, color, False, screen_points, 1)
+            if self.profiler is not None:
+                self.profiler.add('transform', projected - start)
+                self.profiler.add('aalines', time.perf_counter() - projected)
+        # Layers that are no longer drawn start over if they come back
+        self.pending.clear()
+        drawn = {key for key, _ in layers}
+        self.last_points = {key: point for key, point in self.last_points.items() if key in drawn}
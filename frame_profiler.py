@@ -0,0 +1,131 @@
+# frame_profiler.py
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from constants import Constants
+from text_cache import get_font
+
+def current_rss():
+    # Resident set size of this process in bytes, or None if it can't be read cheaply
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+    except (ImportError, AttributeError, OSError):
+        return None
+
+class FrameProfiler:
+    # 'transform' and 'aalines' are a breakdown of 'traces'
+    PHASES = ('events', 'input', 'update', 'traces', 'transform', 'aalines', 'arms', 'text', 'overlay', 'flip')
+    COUNTERS = ('substeps', 'trace_points')
+
+    def __init__(self, window=60, rss_interval=30, overlay_interval=15):
+        self.window = window  # Frames averaged in the overlay
+        self.rss_interval = rss_interval  # Frames between RSS samples
+        self.overlay_interval = overlay_interval  # Frames between overlay text refreshes
+        self.history = deque(maxlen=window)
+        self.frame_index = 0
+        self.rss = None
+        self.overlay_visible = False
+        self.overlay_lines = []
+        self.log_file = None
+        self.csv_writer = None
+        self.start_frame()
+
+    def start_frame(self):
+        self.frame_start = time.perf_counter()
+        self.last_mark = self.frame_start
+        self.timings = dict.fromkeys(self.PHASES, 0.0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def lap(self, phase):
+        # Charge the time since the previous lap (or the frame start) to phase
+        now = time.perf_counter()
+        self.timings[phase] += now - self.last_mark
+        self.last_mark = now
+
+    def add(self, phase, seconds):
+        self.timings[phase] += seconds
+
+    def count(self, name, value):
+        self.counters[name] += value
+
+    def end_frame(self):
+        frame_time = time.perf_counter() - self.frame_start
+        if self.frame_index % self.rss_interval == 0:
+            self.rss = current_rss()
+        sample = {'frame': self.frame_index, 'frame_ms': frame_time * 1000}
+        sample.update((phase, seconds * 1000) for phase, seconds in self.timings.items())
+        sample.update(self.counters)
+        sample['rss_bytes'] = self.rss
+        self.history.append(sample)
+        if self.log_file is not None:
+            self.write_sample(sample)
+        if self.overlay_visible and self.frame_index % self.overlay_interval == 0:
+            self.overlay_lines = self.format_overlay()
+        self.frame_index += 1
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        self.overlay_lines = self.format_overlay() if self.overlay_visible else []
+        state = "shown" if self.overlay_visible else "hidden"
+        print(f"Profiler overlay is now {state}.")
+
+    def format_overlay(self):
+        if not self.history:
+            return []
+        count = len(self.history)
+        mean = lambda key: sum(sample[key] for sample in self.history) / count
+        frame_ms = mean('frame_ms')
+        lines = [f"Frame: {frame_ms:.2f} ms (avg of {count})"]
+        for phase in self.PHASES:
+            phase_ms = mean(phase)
+            share = phase_ms / frame_ms * 100 if frame_ms > 0 else 0
+            lines.append(f"{phase}: {phase_ms:.2f} ms ({share:.0f}%)")
+        latest = self.history[-1]
+        lines.append(f"Sub-steps: {latest['substeps']} (avg {mean('substeps'):.1f} per frame)")
+        lines.append(f"Trace points: {latest['trace_points']}")
+        if latest['rss_bytes'] is not None:
+            lines.append(f"RSS: {latest['rss_bytes'] / 2 ** 20:.1f} MiB")
+        return lines
+
+    def draw_overlay(self, screen):
+        if not self.overlay_visible:
+            return
+        y = 10
+        font = get_font(Constants.FONT_SIZE)
+        for line in self.overlay_lines:
+            # The figures change all the time, so the lines bypass the shared text cache
+            surface = font.render(line, True, Constants.GREEN)
+            screen.blit(surface, (10, y))
+            y += surface.get_height() + 2
+
+    def open_log(self, path):
+        # Stream one sample per frame; CSV for a .csv path, JSON lines otherwise
+        self.close_log()
+        self.log_file = open(path, 'w', newline='')
+        if path.lower().endswith('.csv'):
+            fields = ['frame', 'frame_ms', *self.PHASES, *self.COUNTERS, 'rss_bytes']
+            self.csv_writer = csv.DictWriter(self.log_file, fieldnames=fields)
+            self.csv_writer.writeheader()
+
+    def write_sample(self, sample):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(sample)
+        else:
+            self.log_file.write(json.dumps(sample) + '\n')
+
+    def close_log(self):
+        if self.log_file is not None:
+            self.log_file.close()
+        self.log_file = None
+        self.csv_writer = None
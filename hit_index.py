@@ -0,0 +1,29 @@
+# hit_index.py
+
+class HitIndex:
+    def __init__(self, cell_size=64):
+        # Widgets are bucketed by the grid cells their rect overlaps, so finding the
+        # widget under the mouse only checks the few widgets sharing that cell
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> widgets overlapping the cell, in the order they were added
+        self.widgets = []
+
+    def clear(self):
+        self.cells = {}
+        self.widgets = []
+
+    def add(self, widget):
+        rect = widget.rect
+        size = self.cell_size
+        for column in range(rect.left // size, (rect.right - 1) // size + 1):
+            for row in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                self.cells.setdefault((column, row), []).append(widget)
+        self.widgets.append(widget)
+
+    def at(self, pos):
+        # Returns the widget whose rect contains pos, the last added one if several do
+        cell = (pos[0] // self.cell_size, pos[1] // self.cell_size)
+        for widget in reversed(self.cells.get(cell, ())):
+            if widget.rect.collidepoint(pos):
+                return widget
+        return None
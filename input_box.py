@@ -2,6 +2,28 @@
 
 import pygame
 from constants import Constants
+from text_cache import get_font, render_text
+
+def parse_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+def parse_color(text):
+    # '#RRGGBB' or 'RRGGBB' as an (r, g, b) tuple, or None if invalid
+    text = text.strip()
+    if text.startswith('#'):
+        text = text[1:]
+    if len(text) != 6:
+        return None
+    try:
+        r = int(text[0:2], 16)
+        g = int(text[2:4], 16)
+        b = int(text[4:6], 16)
+        return (r, g, b)
+    except ValueError:
+        return None
 
 class InputBox:
     def __init__(self, x, y, w, h, placeholder='', unit=''):
@@ -10,15 +32,17 @@ class InputBox:
         self.text = ''
         self.placeholder = placeholder
         self.unit = unit
-        self.font = pygame.font.SysFont(None, Constants.FONT_SIZE)
-        self.txt_surface = self.font.render(
+        self.font = get_font(Constants.FONT_SIZE)
+        self.txt_surface = render_text(
             self.text if self.text else self.placeholder,
-            True,
+            Constants.FONT_SIZE,
             Constants.WHITE if self.text else Constants.GRAY
         )
         self.active = False
+        self.dirty = True  # Whether the box needs to be drawn again
 
     def handle_event(self, event):
+        previous = (self.active, self.text)
         if event.type == pygame.MOUSEBUTTONDOWN:
             # If the user clicked on the input_box rect.
             self.active = self.rect.collidepoint(event.pos)
@@ -35,11 +59,21 @@ class InputBox:
                         self.text += event.unicode
                 # Re-render the text.
                 display_text = self.text if self.text else self.placeholder
-                self.txt_surface = self.font.render(
+                self.txt_surface = render_text(
                     display_text,
-                    True,
+                    Constants.FONT_SIZE,
                     Constants.WHITE if self.text else Constants.GRAY
                 )
+        if (self.active, self.text) != previous:
+            self.dirty = True
+
+    def get_bounds(self):
+        # Screen area the box draws on, including its unit label
+        bounds = self.rect.copy()
+        if self.unit:
+            unit_surf = render_text(self.unit, Constants.FONT_SIZE, Constants.WHITE)
+            bounds.union_ip(unit_surf.get_rect(topleft=(self.rect.x + self.rect.width + 10, self.rect.y + 8)))
+        return bounds
 
     def draw(self, screen):
         # Blit the text.
@@ -48,18 +82,25 @@ class InputBox:
         pygame.draw.rect(screen, self.color, self.rect, 2)
         # Blit the unit label
         if self.unit:
-            unit_surf = self.font.render(self.unit, True, Constants.WHITE)
+            unit_surf = render_text(self.unit, Constants.FONT_SIZE, Constants.WHITE)
             screen.blit(unit_surf, (self.rect.x + self.rect.width + 10, self.rect.y + 8))
 
+    def set_text(self, text):
+        self.text = text
+        self.txt_surface = render_text(
+            self.text if self.text else self.placeholder,
+            Constants.FONT_SIZE,
+            Constants.WHITE if self.text else Constants.GRAY
+        )
+        self.dirty = True
+
     def get_value(self):
-        try:
-            return float(self.text)
-        except ValueError:
-            return None
+        return parse_number(self.text)
 
     def clear(self):
         self.text = ''
-        self.txt_surface = self.font.render(self.placeholder, True, Constants.GRAY)
+        self.txt_surface = render_text(self.placeholder, Constants.FONT_SIZE, Constants.GRAY)
+        self.dirty = True
 
 class ColorInput(InputBox):
     def __init__(self, x, y, w, h, placeholder='', unit=''):
@@ -67,18 +108,7 @@ class ColorInput(InputBox):
         # Set default color to a visible color, e.g., red
         if not self.text:
             self.text = '#FF0000'
-            self.txt_surface = self.font.render(self.text, True, Constants.WHITE)
+            self.txt_surface = render_text(self.text, Constants.FONT_SIZE, Constants.WHITE)
 
     def get_color(self):
-        text = self.text.strip()
-        if text.startswith('#'):
-            text = text[1:]
-        if len(text) != 6:
-            return None
-        try:
-            r = int(text[0:2], 16)
-            g = int(text[2:4], 16)
-            b = int(text[4:6], 16)
-            return (r, g, b)
-        except ValueError:
-            return None
+        return parse_color(self.text)
@@ -1,16 +1,51 @@
 # main.py
 
+import argparse
+import os
 import pygame
 from constants import Constants
 from visualization_app import VisualizationApp
+from trace_exporter import TraceExporter
 
 def main():
+    parser = argparse.ArgumentParser(description="Rotating Lines Visualization")
+    parser.add_argument('--threaded', action='store_true',
+                        help="Run the simulation on a background thread at a fixed rate")
+    parser.add_argument('--metrics', help="Stream per-frame timings to this file (.csv, otherwise JSON lines)")
+    parser.add_argument('--session', help="Resume from this session file if it exists, and save to it when leaving the visualization")
+    parser.add_argument('--export', help="Stream every new trace point to this file (.csv, otherwise binary)")
+    parser.add_argument('--compare', nargs='+', default=[], metavar='CONFIG',
+                        help="Also show these JSON or CSV configurations next to the edited one (G overlays them)")
+    parser.add_argument('--overlay', action='store_true', help="Overlay the compared configurations instead of a grid")
+    parser.add_argument('--fading-trails', action='store_true',
+                        help="Draw trails that fade out instead of keeping the whole trace (toggle with T)")
+    parser.add_argument('--config', help="Start visualizing this JSON or CSV configuration; the C key exports to it")
+    args = parser.parse_args()
+
     pygame.init()
     screen = pygame.display.set_mode((Constants.WIDTH, Constants.HEIGHT))
     pygame.display.set_caption("Rotating Lines Visualization")
     clock = pygame.time.Clock()
 
     app = VisualizationApp(screen)
+    app.threaded_simulation = args.threaded
+    if args.metrics:
+        app.profiler.open_log(args.metrics)
+    if args.export:
+        app.exporter = TraceExporter(args.export)
+        app.exporter.start()
+    for path in args.compare:
+        app.compare_configuration(path)
+    if args.overlay:
+        app.layout = Constants.OVERLAY_LAYOUT
+    if args.fading_trails:
+        app.set_fading_trail(True)
+    if args.config:
+        app.import_configuration(args.config)
+    if args.session:
+        app.session_path = args.session
+        if os.path.exists(args.session):
+            app.load_session(args.session)
     app.run(clock)
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+# render.py
+
+import argparse
+import os
+import sys
+import time
+
+# Render without a window; must be set before pygame initializes its display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+from constants import Constants
+from visualization_app import VisualizationApp
+from config_file import ConfigError, load_config
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render the rotating lines visualization without a window.")
+    parser.add_argument('config', help="JSON or CSV file with lengths, speeds, phases and joints")
+    parser.add_argument('-n', '--frames', type=int, default=600, help="Number of frames to render")
+    parser.add_argument('-o', '--output', default='frames',
+                        help="Directory for the PNG sequence, or '-' to write raw RGB frames to stdout")
+    parser.add_argument('--speed', type=float, default=1.0, help="Speed multiplier")
+    parser.add_argument('--scale', type=float, default=1.0, help="Zoom level")
+    parser.add_argument('--hide-ui', action='store_true', help="Hide lines, joints and texts")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    raw = args.output == '-'
+    if raw:
+        stream = sys.stdout.buffer
+        sys.stdout = sys.stderr  # Keep the app's status messages out of the video stream
+    else:
+        os.makedirs(args.output, exist_ok=True)
+
+    try:
+        lengths, speeds, phases, joints = load_config(args.config)
+    except (OSError, ConfigError) as error:
+        print(f"Invalid configuration: {error}", file=sys.stderr)
+        return 1
+
+    pygame.init()
+    screen = pygame.display.set_mode((Constants.WIDTH, Constants.HEIGHT))
+
+    app = VisualizationApp(screen)
+    if not app.load_configuration(lengths, speeds, joints, phases):
+        print("Invalid configuration.", file=sys.stderr)
+        return 1
+    app.speed_multiplier = args.speed
+    app.scale = args.scale
+    app.hidden = args.hide_ui
+
+    # No frame limiter: render as fast as update and draw allow
+    start = time.perf_counter()
+    for frame in range(args.frames):
+        app.update_visualization()
+        app.draw_visualization_screen()
+        if raw:
+            stream.write(pygame.image.tobytes(screen, 'RGB'))
+        else:
+            pygame.image.save(screen, os.path.join(args.output, f"frame_{frame:05d}.png"))
+    if raw:
+        stream.flush()
+    elapsed = time.perf_counter() - start
+
+    # Report on stderr so a raw stream on stdout stays clean
+    fps = args.frames / elapsed if elapsed > 0 else float('inf')
+    print(f"Rendered {args.frames} frames ({Constants.WIDTH}x{Constants.HEIGHT}) in {elapsed:.2f}s: {fps:.1f} fps",
+          file=sys.stderr)
+    pygame.quit()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# sample_trace.py
+
+import numpy as np
+from constants import Constants
+from trace_index import TraceIndex
+
+class SampleTimes:
+    def __init__(self, capacity=Constants.TRACE_CAPACITY):
+        self.capacity = max(int(capacity), 1)
+        # Storage is allocated on the first extend and grows by doubling up to capacity
+        self.times = np.empty(0, dtype=np.float64)  # 8 bytes per sample, however many joints are traced
+        self.start = 0  # Index of the oldest sample
+        self.count = 0
+        self.total = 0  # Number of samples ever appended, including dropped ones
+
+    @classmethod
+    def from_storage(cls, capacity, times, start, count, total):
+        # Wraps existing ring storage, such as an array memory-mapped from a session file, without copying
+        samples = cls.__new__(cls)
+        samples.capacity = max(int(capacity), 1)
+        samples.times = times
+        samples.start = start
+        samples.count = count
+        samples.total = total
+        return samples
+
+    def __len__(self):
+        return self.count
+
+    def extend(self, times):
+        times = np.asarray(times, dtype=np.float64).reshape(-1)
+        skipped = max(len(times) - self.capacity, 0)
+        self.total += skipped
+        if skipped:
+            # Only the newest samples can survive anyway
+            times = times[-self.capacity:]
+        n = len(times)
+        if n == 0:
+            return
+        self.total += n
+        if self.count + n > len(self.times) and len(self.times) < self.capacity:
+            self._grow(self.count + n)
+        size = len(self.times)
+        end = (self.start + self.count) % size
+        first = min(n, size - end)
+        self.times[end:end + first] = times[:first]
+        self.times[:n - first] = times[first:]
+        overflow = self.count + n - size
+        if overflow > 0:
+            # Overwrote the oldest samples
+            self.start = (self.start + overflow) % size
+            self.count = size
+        else:
+            self.count += n
+
+    def _grow(self, required):
+        # Only called before the buffer first wraps, so the samples are stored in order
+        new_size = min(self.capacity, max(len(self.times) * 2, required, 1024))
+        times = np.empty(new_size, dtype=np.float64)
+        times[:self.count] = self.range(self.first_index(), self.total)
+        self.times = times
+        self.start = 0
+
+    def truncate(self, time):
+        # Drops the newest samples later than time and returns their times; the times are
+        # stored in increasing order
+        stored = self.range(self.first_index(), self.total)
+        kept = int(np.searchsorted(stored, time, side='right'))
+        removed = stored[kept:].copy()
+        self.count -= len(removed)
+        self.total -= len(removed)
+        return removed
+
+    def first_index(self):
+        # Absolute index of the oldest sample still stored
+        return self.total - self.count
+
+    def range(self, start, stop):
+        # Returns the sample times with absolute indices start to stop (exclusive), oldest-first
+        start = max(start, self.first_index())
+        stop = min(stop, self.total)
+        if stop <= start:
+            return self.times[:0]
+        size = len(self.times)
+        begin = (self.start + start - self.first_index()) % size
+        end = begin + stop - start
+        if end <= size:
+            return self.times[begin:end]
+        return np.concatenate((self.times[begin:], self.times[:end - size]))
+
+class PositionTrace:
+    def __init__(self, samples, engine, column, block_size=65536):
+        # The trace of one column of engine.positions (a joint, or the endpoint) at every
+        # sample time. Points are computed when they are drawn rather than stored; only the
+        # last window asked for, the newest points and the chunk bounds used for culling are kept.
+        self.samples = samples
+        self.engine = engine
+        self.column = column
+        self.block_size = block_size  # Samples materialized at once while indexing
+        self.window = (0, 0, np.empty((0, 2)))  # (start, stop, points) of the last range
+        # (start, stop, points) of up to block_size of the newest points, computed by the
+        # simulation as it appends samples (see append_tail) so drawing them costs nothing
+        self.tail_window = (0, 0, np.empty((0, 2)))
+        self.bounds_index = TraceIndex(samples.capacity)
+        self.indexed_total = 0  # Samples already added to bounds_index
+
+    @property
+    def total(self):
+        return self.samples.total
+
+    def __len__(self):
+        return len(self.samples)
+
+    def first_index(self):
+        return self.samples.first_index()
+
+    def truncate(self, removed_times):
+        # Call after the samples were truncated, with the times SampleTimes.truncate returned:
+        # forgets the points of the removed samples and returns the box (min x, min y, max x,
+        # max y) holding the removed segments, or None if it is not worth computing.
+        # Chunk bounds are kept as they are, which only makes them more conservative.
+        total = self.total
+        for name in ('window', 'tail_window'):
+            start, stop, points = getattr(self, name)
+            if stop > total:
+                setattr(self, name, (start, max(total, start), points[:max(total - start, 0)]))
+        self.indexed_total = min(self.indexed_total, total)
+        if len(removed_times) > self.block_size:
+            return None  # Most likely covers everything that is drawn anyway
+        # The removed segments start at the newest point left
+        removed = self.materialize(np.concatenate((self.samples.range(total - 1, total), removed_times)))
+        return tuple(removed.min(axis=0).tolist() + removed.max(axis=0).tolist())
+
+    def materialize(self, times):
+        positions = self.engine.column_positions(times, self.column)
+        return np.column_stack((positions.real, positions.imag))
+
+    def append_tail(self, points):
+        # Call after the samples were extended, with the points of the newest samples
+        # (usually from materialize), which range and runs then return without computing them
+        total = self.total
+        points = points[-self.block_size:]
+        _, stop, cached = self.tail_window
+        if stop == total - len(points):
+            points = np.concatenate((cached, points))[-self.block_size:]
+        self.tail_window = (total - len(points), total, points)
+
+    def cached(self, runs):
+        # Returns the cached points holding every (start, stop) range in runs, and their first index
+        for window_start, window_stop, points in (self.window, self.tail_window):
+            if all(window_start <= start and stop <= window_stop for start, stop in runs if stop > start):
+                return window_start, points
+        return None
+
+    def range(self, start, stop):
+        # Returns the points with absolute indices start to stop (exclusive) as an (n, 2) array
+        start = max(start, self.first_index())
+        stop = min(stop, self.total)
+        if stop <= start:
+            return np.empty((0, 2))
+        cached = self.cached([(start, stop)])
+        if cached is not None:
+            window_start, points = cached
+            return points[start - window_start:stop - window_start]
+        points = self.materialize(self.samples.range(start, stop))
+        self.window = (start, stop, points)
+        return points
+
+    def runs(self, runs):
+        # Returns the points of several (start, stop) index ranges back to back as an (n, 2)
+        # array, computed in one batch, and the offsets of the ranges in it
+        first, total = self.first_index(), self.total
+        runs = [(max(start, first), min(stop, total)) for start, stop in runs]
+        offsets = np.cumsum([0] + [max(stop - start, 0) for start, stop in runs])
+        cached = self.cached(runs)
+        if cached is not None:
+            window_start, points = cached
+            parts = [points[start - window_start:stop - window_start] for start, stop in runs if stop > start]
+            return (np.concatenate(parts) if parts else np.empty((0, 2))), offsets
+        times = [self.samples.range(start, stop) for start, stop in runs if stop > start]
+        return self.materialize(np.concatenate(times) if times else np.empty(0)), offsets
+
+    def view(self):
+        return self.range(self.first_index(), self.total)
+
+    def tail(self, n):
+        return self.range(self.total - max(n, 0), self.total)
+
+    @property
+    def index(self):
+        # Chunked bounding boxes for viewport culling, brought up to date with the samples
+        total = self.total
+        start = max(self.indexed_total, self.first_index())
+        for block_start in range(start, total, self.block_size):
+            block_stop = min(block_start + self.block_size, total)
+            self.bounds_index.add(block_start, self.range(block_start, block_stop))
+        self.indexed_total = total
+        return self.bounds_index
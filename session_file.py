@@ -0,0 +1,70 @@
+# session_file.py
+
+import json
+import os
+import struct
+import numpy as np
+from sample_trace import SampleTimes
+
+# Layout: magic, header length (little-endian uint64), JSON header, then the raw
+# little-endian float64 ring storage of the sample times, starting on an ALIGNMENT boundary.
+# The storage is saved exactly as it is held in memory, so loading maps it back in place
+# without reading it. Trace points are computed from the times, so they are not saved.
+MAGIC = b'SPINSES1'
+VERSION = 2  # Version 1 stored the points of every trace instead of the sample times
+ALIGNMENT = 64
+DTYPE = np.dtype('<f8')
+
+def padding(offset):
+    return -offset % ALIGNMENT
+
+def save_session(path, state, samples):
+    # state is a JSON-serializable dict; samples is the SampleTimes of the traces.
+    # Written to a temporary file first, so a session that is still mapped can be overwritten.
+    entry = {
+        'capacity': samples.capacity,
+        'start': samples.start,
+        'count': samples.count,
+        'total': samples.total,
+        'rows': len(samples.times),
+    }
+
+    # The array offset depends on the header length, which depends on the offset
+    offset = 0
+    while True:
+        header = json.dumps(dict(state, version=VERSION, samples=entry, offset=offset)).encode('utf-8')
+        new_offset = len(MAGIC) + 8 + len(header)
+        new_offset += padding(new_offset)
+        if new_offset == offset:
+            break
+        offset = new_offset
+
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        f.write(b'\0' * (offset - f.tell()))
+        f.write(np.ascontiguousarray(samples.times, dtype=DTYPE).data)
+    os.replace(temporary, path)
+
+def map_array(path, offset, shape):
+    if shape[0] == 0:
+        return np.empty(shape, dtype=DTYPE)  # Nothing to map for samples that never grew
+    return np.memmap(path, dtype=DTYPE, mode='c', offset=offset, shape=shape)
+
+def load_session(path):
+    # Returns (state, samples). The times are mapped copy-on-write, so pages are only
+    # read when they are drawn and new samples never modify the file.
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session file")
+        header_length, = struct.unpack('<Q', f.read(8))
+        state = json.loads(f.read(header_length).decode('utf-8'))
+    if state.pop('version') != VERSION:
+        raise ValueError(f"{path} uses an unsupported session version")
+
+    entry = state.pop('samples')
+    times = map_array(path, state.pop('offset'), (entry['rows'],))
+    samples = SampleTimes.from_storage(entry['capacity'], times, entry['start'], entry['count'], entry['total'])
+    return state, samples
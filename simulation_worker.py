@@ -0,0 +1,33 @@
+# simulation_worker.py
+
+import threading
+import time
+from constants import Constants
+
+class SimulationWorker(threading.Thread):
+    def __init__(self, app, rate=Constants.SIMULATION_RATE, max_catch_up=5):
+        super().__init__(daemon=True)
+        self.app = app
+        self.step = 1.0 / rate  # Seconds of wall time per simulation tick
+        self.max_catch_up = max_catch_up  # Ticks run back to back before dropping the backlog
+        self.stop_event = threading.Event()
+
+    def run(self):
+        # Fixed timestep: every tick moves the simulation by speed_multiplier time units,
+        # as one rendered frame does when the simulation runs on the render thread
+        next_tick = time.perf_counter()
+        while not self.stop_event.is_set():
+            ticks = 0
+            while time.perf_counter() >= next_tick and ticks < self.max_catch_up:
+                self.app.tick_simulation()
+                next_tick += self.step
+                ticks += 1
+            if time.perf_counter() >= next_tick:
+                # Too slow to keep up: drop the backlog instead of spiralling
+                next_tick = time.perf_counter() + self.step
+            self.stop_event.wait(max(next_tick - time.perf_counter(), 0))
+
+    def stop(self):
+        self.stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
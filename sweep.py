@@ -0,0 +1,198 @@
+# sweep.py
+
+import argparse
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Render without a window; must be set before pygame initializes its display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+from constants import Constants
+from epicycle_engine import EpicycleEngine
+from text_cache import get_font
+from trace_lod import decimate
+
+# Example spec:
+# {
+#     "lengths": [150, 50, 30],
+#     "speeds": [0.05, -0.15, 0.2],
+#     "vary": {
+#         "lengths[1]": [20, 50, 80],
+#         "speeds[2]": {"start": 0.1, "stop": 0.5, "num": 5}
+#     },
+#     "periods": 1,
+#     "max_time": 5000,
+#     "thumbnail": 200,
+#     "columns": 8,
+#     "rows": 6
+# }
+PARAMETER = re.compile(r'^(lengths|speeds)\[(\d+)\]$')
+MAX_SAMPLES = 2_000_000  # Per configuration, whatever the period
+
+def parse_values(values):
+    # A list of values, or a {"start", "stop", "num"} range with both ends included
+    if isinstance(values, dict):
+        return np.linspace(values['start'], values['stop'], int(values['num'])).tolist()
+    return [float(value) for value in values]
+
+def build_configurations(spec):
+    if not isinstance(spec, dict) or not isinstance(spec.get('vary', {}), dict):
+        raise TypeError("expected an object, with an object of parameters under 'vary'")
+    lengths = [float(length) for length in spec['lengths']]
+    speeds = [float(speed) for speed in spec['speeds']]
+    if len(lengths) != len(speeds):
+        raise ValueError("lengths and speeds must have the same number of entries")
+    parameters = []
+    for name, values in spec.get('vary', {}).items():
+        match = PARAMETER.match(name)
+        if match is None or int(match.group(2)) >= len(lengths):
+            raise ValueError(f"Unknown sweep parameter '{name}', expected lengths[i] or speeds[i]")
+        parameters.append((match.group(1), int(match.group(2)), name, parse_values(values)))
+
+    configurations = []
+    for combination in itertools.product(*(values for _, _, _, values in parameters)):
+        config = {'lengths': list(lengths), 'speeds': list(speeds), 'parameters': {}}
+        for (kind, index, name, _), value in zip(parameters, combination):
+            config[kind][index] = value
+            config['parameters'][name] = value
+        configurations.append(config)
+    return configurations
+
+def render_thumbnail(job):
+    # Runs in a worker process: traces the full curve and returns it as raw RGB bytes
+    config, size, periods, max_time, max_pixel_error = job
+    engine = EpicycleEngine(config['lengths'], config['speeds'])
+    reach = float(np.sum(np.abs(engine.lengths)))
+    scale = (size / 2 - 2) / reach if reach > 0 else 1.0
+
+    # A curve that only closes after max_time is traced like one that never does
+    period = engine.period(max_period=max_time)
+    duration = period * periods if period else max_time
+    step = engine.max_delta_time(max_pixel_error, scale, duration)
+    samples = min(max(int(math.ceil(duration / step)), 1) + 1, MAX_SAMPLES) if duration > 0 else 1
+
+    surface = pygame.Surface((size, size))
+    surface.fill(Constants.BLACK)
+    origin = np.array((size / 2, size / 2))
+    chunk = max(1, 1_000_000 // (engine.arm_count + 1))
+    previous = None
+    for start in range(0, samples, chunk):
+        times = np.arange(start, min(start + chunk, samples)) * (duration / max(samples - 1, 1))
+        endpoints = engine.positions(times)[:, -1]
+        points = np.column_stack((endpoints.real, endpoints.imag))
+        if previous is not None:
+            points = np.vstack((previous, points))  # Join up with the previous chunk
+        previous = points[-1:]
+        simplified, _ = decimate(points, scale)
+        if len(simplified) and np.any(simplified[-1] != points[-1]):
+            simplified = np.vstack((simplified, points[-1:]))
+        if len(simplified) > 1:
+            pygame.draw.aalines(surface, Constants.DRAW_COLOR, False, (simplified * scale + origin).tolist(), 1)
+    return pygame.image.tobytes(surface, 'RGB'), period, samples
+
+def label_lines(config):
+    # One line per varied parameter, so the values that tell the cells apart are never cut off
+    if not config['parameters']:
+        return ["base"]
+    return [f"{name}={value:g}" for name, value in config['parameters'].items()]
+
+def fit_label(font, text, width):
+    # Shortens text with a trailing "..." until it fits in width pixels
+    if font.size(text)[0] <= width:
+        return text
+    while text and font.size(text + "...")[0] > width:
+        text = text[:-1]
+    return text + "..."
+
+def assemble_sheets(results, configurations, spec, output):
+    size = spec.get('thumbnail', 200)
+    columns = spec.get('columns', 8)
+    rows = spec.get('rows', 6)
+    font = get_font(Constants.FONT_SIZE - 6)
+    # Every configuration varies the same parameters, so the labels have as many lines
+    line_height = font.get_linesize()
+    label_height = line_height * (max(len(configurations[0]['parameters']), 1) if configurations else 1) + 6
+    cell_width, cell_height = size, size + label_height
+
+    per_sheet = columns * rows
+    index = []
+    for sheet_number in range(math.ceil(len(configurations) / per_sheet)):
+        entries = list(range(sheet_number * per_sheet, min((sheet_number + 1) * per_sheet, len(configurations))))
+        used_rows = math.ceil(len(entries) / columns)
+        sheet = pygame.Surface((columns * cell_width, used_rows * cell_height))
+        sheet.fill(Constants.BLACK)
+        sheet_name = f"sheet_{sheet_number:03d}.png"
+        for position, entry in enumerate(entries):
+            pixels, period, samples = results[entry]
+            config = configurations[entry]
+            x, y = (position % columns) * cell_width, (position // columns) * cell_height
+            sheet.blit(pygame.image.frombytes(pixels, (size, size), 'RGB'), (x, y))
+            pygame.draw.rect(sheet, Constants.GRAY, (x, y, size, size), 1)
+            for number, line in enumerate(label_lines(config)):
+                label = font.render(fit_label(font, line, cell_width - 8), True, Constants.FAINT_WHITE)
+                sheet.blit(label, (x + 4, y + size + 3 + number * line_height), (0, 0, cell_width - 8, line_height))
+            index.append({
+                'sheet': sheet_name,
+                'column': position % columns,
+                'row': position // columns,
+                'lengths': config['lengths'],
+                'speeds': config['speeds'],
+                'parameters': config['parameters'],
+                'period': period,
+                'samples': samples,
+            })
+        pygame.image.save(sheet, os.path.join(output, sheet_name))
+    with open(os.path.join(output, 'index.json'), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render a sweep over line lengths and speeds into contact sheets.")
+    parser.add_argument('spec', help="JSON sweep specification")
+    parser.add_argument('-o', '--output', default='sweep', help="Directory for the contact sheets and index.json")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="Worker processes")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        with open(args.spec) as f:
+            spec = json.load(f)
+    except (OSError, json.JSONDecodeError) as error:
+        print(f"Could not read sweep specification: {error}", file=sys.stderr)
+        return 1
+    try:
+        configurations = build_configurations(spec)
+    except (KeyError, ValueError, TypeError) as error:
+        print(f"Invalid sweep specification: {error}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+
+    jobs = [(config, spec.get('thumbnail', 200), spec.get('periods', 1), spec.get('max_time', 5000.0),
+             spec.get('max_pixel_error', 0.25)) for config in configurations]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        # Several configurations per task keep the inter-process overhead small
+        chunksize = max(1, len(jobs) // (args.jobs * 4))
+        results = list(pool.map(render_thumbnail, jobs, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    pygame.init()
+    index = assemble_sheets(results, configurations, spec, args.output)
+    pygame.quit()
+    sheets = len({entry['sheet'] for entry in index})
+    print(f"Rendered {len(configurations)} configurations with {args.jobs} processes in {elapsed:.2f}s "
+          f"({len(configurations) / elapsed:.1f} per second); wrote {sheets} contact sheets to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
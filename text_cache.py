@@ -0,0 +1,14 @@
+# text_cache.py
+
+from functools import lru_cache
+import pygame
+
+@lru_cache(maxsize=None)
+def get_font(size):
+    # One shared font object per size
+    return pygame.font.SysFont(None, size)
+
+@lru_cache(maxsize=1024)
+def render_text(text, size, color, antialias=True):
+    # Rendered text surfaces are shared between callers: blit them, never draw on them
+    return get_font(size).render(text, antialias, color)
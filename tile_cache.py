@@ -0,0 +1,259 @@
+# tile_cache.py
+
+import math
+from collections import OrderedDict
+import numpy as np
+import pygame
+from constants import Constants
+from trace_lod import decimate_runs
+
+def tile_blocks(tiles):
+    # Splits (column, row) tiles into rectangular blocks of tiles: runs of adjacent tiles in a
+    # row, merged with the runs spanning the same columns in the rows below. Tiles dropped
+    # here and there are then not drawn as one block spanning the whole screen.
+    runs = {}  # (first column, last column) -> blocks of rows ending with that run
+    for row in sorted({row for _, row in tiles}):
+        columns = sorted(column for column, tile_row in tiles if tile_row == row)
+        starts = [column for column in columns if column - 1 not in columns]
+        ends = [column for column in columns if column + 1 not in columns]
+        for span in zip(starts, ends):
+            blocks = runs.setdefault(span, [])
+            if blocks and blocks[-1][-1] == row - 1:
+                blocks[-1].append(row)
+            else:
+                blocks.append([row])
+    return [[(column, row) for column in range(first, last + 1) for row in rows]
+            for (first, last), blocks in runs.items() for rows in blocks]
+
+class TraceTile:
+    def __init__(self, size, background):
+        self.surface = pygame.Surface((size, size))
+        self.surface.fill(background)
+        self.drawn_totals = []  # Trace total already drawn, per trace
+        self.stale = []  # Boxes (min x, min y, max x, max y) in trace coordinates holding dropped points
+
+class TileCache:
+    def __init__(self, tile_size=Constants.TILE_SIZE, memory_budget=Constants.TILE_CACHE_BYTES,
+                 background=Constants.BLACK, tolerance=Constants.LOD_TOLERANCE, head_size=4096):
+        # Tiles cover tile_size screen pixels of the trace rasterized at one zoom level and
+        # are aligned to the trace origin, so panning by whole pixels reuses them
+        self.tile_size = tile_size
+        self.max_tiles = max(memory_budget // (tile_size * tile_size * 4), 1)
+        self.background = background
+        self.tolerance = tolerance
+        self.tiles = OrderedDict()  # (level, column, row) -> TraceTile, least recently used first
+        self.traces = []  # Traces the cached tiles were drawn from
+        self.first_indices = []  # Oldest point of each trace when the tiles were last composed
+        # The oldest head_size + 1 points of each trace at that time, so the segments the ring
+        # buffer drops next can be erased exactly
+        self.head_size = head_size
+        self.heads = []
+        self.max_stale = 16  # Boxes kept per tile before they are merged into one
+
+    def clear(self):
+        self.tiles.clear()
+        self.traces = []
+        self.first_indices = []
+        self.heads = []
+
+    def truncate(self, bounds):
+        # Call when the newest points were removed from the traces. Only the tiles the removed
+        # segments crossed, within bounds (min x, min y, max x, max y) in trace coordinates,
+        # are dropped and drawn again; the others just forget the removed points.
+        for key, _ in self.tiles_crossing(np.array([bounds])):
+            del self.tiles[key]
+        for tile in self.tiles.values():
+            tile.drawn_totals = [min(drawn_total, trace.total)
+                                 for drawn_total, trace in zip(tile.drawn_totals, self.traces)]
+        self.heads = [head[:max(trace.total - first_index, 0)]
+                      for head, trace, first_index in zip(self.heads, self.traces, self.first_indices)]
+
+    def evict(self, traces):
+        # Tiles can't erase the points the ring buffer has dropped since they were drawn, so the
+        # parts of the tiles those segments crossed are marked stale and drawn again. The
+        # segments are known exactly while they are among the head points kept; beyond that,
+        # the chunk bounds of the trace index hold them until the chunks are reused.
+        if [trace for trace, _ in traces] != self.traces:
+            return
+        for idx, (trace, _) in enumerate(traces):
+            first_index, head = trace.first_index(), self.heads[idx]
+            dropped = first_index - self.first_indices[idx]
+            if dropped <= 0:
+                continue
+            if dropped < len(head):
+                boxes = np.hstack((np.minimum(head[:dropped], head[1:dropped + 1]),
+                                   np.maximum(head[:dropped], head[1:dropped + 1])))
+            else:
+                bounds = trace.bounds_index.range_bounds(self.first_indices[idx], first_index)
+                if bounds is None:
+                    self.clear()
+                    return
+                boxes = np.array([bounds])
+            for key, crossing in self.tiles_crossing(boxes):
+                tile = self.tiles[key]
+                tile.stale.extend(boxes[crossing].tolist())
+                if len(tile.stale) > self.max_stale:
+                    stale = np.array(tile.stale)
+                    tile.stale = [stale[:, :2].min(axis=0).tolist() + stale[:, 2:].max(axis=0).tolist()]
+            self.first_indices[idx] = first_index
+            self.heads[idx] = self.head(trace)
+
+    def head(self, trace):
+        first_index = trace.first_index()
+        return trace.materialize(trace.samples.range(first_index, first_index + self.head_size + 1))
+
+    def tiles_crossing(self, boxes):
+        # Returns (key, mask) for every tile crossed by one of boxes, an (n, 4) array of
+        # (min x, min y, max x, max y) in trace coordinates; mask tells which ones
+        size = self.tile_size
+        margin = 1  # Pixels, for anti-aliasing
+        crossed = []
+        for key in self.tiles:
+            (scale, offset_x, offset_y), column, row = key
+            left, top = (column * size - offset_x - margin) / scale, (row * size - offset_y - margin) / scale
+            right, bottom = left + (size + 2 * margin) / scale, top + (size + 2 * margin) / scale
+            mask = ((boxes[:, 0] <= right) & (boxes[:, 2] >= left) &
+                    (boxes[:, 1] <= bottom) & (boxes[:, 3] >= top))
+            if mask.any():
+                crossed.append((key, mask))
+        return crossed
+
+    def compose(self, surface, traces, scale, origin, rasterize):
+        # Draws the traces onto surface, where trace point (0, 0) sits at screen position origin.
+        # Missing tiles are drawn in blocks by rasterize(surface, traces, scale, to_screen, viewport),
+        # and the parts of cached tiles that showed points since dropped are drawn again.
+        self.evict(traces)
+        if [trace for trace, _ in traces] != self.traces:
+            self.clear()
+            self.traces = [trace for trace, _ in traces]
+            self.first_indices = [trace.first_index() for trace, _ in traces]
+            self.heads = [self.head(trace) for trace, _ in traces]
+
+        size = self.tile_size
+        base_x, base_y = math.floor(origin[0]), math.floor(origin[1])
+        # Sub-pixel origin offset (only from clamped pans) gets its own tiles
+        level = (round(scale, 6), round(origin[0] - base_x, 3), round(origin[1] - base_y, 3))
+        width, height = surface.get_size()
+        columns = range(-base_x // size, (width - 1 - base_x) // size + 1)
+        rows = range(-base_y // size, (height - 1 - base_y) // size + 1)
+
+        missing = [(column, row) for column in columns for row in rows if (level, column, row) not in self.tiles]
+        for block in tile_blocks(missing):
+            self.build_tiles(level, block, traces, scale, (origin[0] - base_x, origin[1] - base_y), rasterize)
+
+        grid = [(self.get_tile(level, column, row), column, row) for column in columns for row in rows]
+        self.repair_tiles([(tile, (origin[0] - base_x - column * size, origin[1] - base_y - row * size))
+                           for tile, column, row in grid if tile.stale], traces, scale)
+        for tile, column, row in grid:
+            self.update_tile(tile, traces, scale, (origin[0] - base_x - column * size,
+                                                   origin[1] - base_y - row * size))
+            surface.blit(tile.surface, (base_x + column * size, base_y + row * size))
+
+    def build_tiles(self, level, missing, traces, scale, grid_origin, rasterize):
+        # Rasterize the block of tiles around the missing ones in one go, then cut it up
+        size = self.tile_size
+        first_column = min(column for column, _ in missing)
+        first_row = min(row for _, row in missing)
+        block_columns = max(column for column, _ in missing) - first_column + 1
+        block_rows = max(row for _, row in missing) - first_row + 1
+        block = pygame.Surface((block_columns * size, block_rows * size))
+        block.fill(self.background)
+        block_origin = np.array((grid_origin[0] - first_column * size, grid_origin[1] - first_row * size))
+        margin = 1  # Pixels, for anti-aliasing
+        viewport = ((-margin - block_origin[0]) / scale, (-margin - block_origin[1]) / scale,
+                    (block.get_width() + margin - block_origin[0]) / scale,
+                    (block.get_height() + margin - block_origin[1]) / scale)
+        rasterize(block, traces, scale, lambda points: (points * scale + block_origin).tolist(), viewport)
+
+        totals = [trace.total for trace, _ in traces]
+        for column, row in missing:
+            tile = TraceTile(size, self.background)
+            area = pygame.Rect((column - first_column) * size, (row - first_row) * size, size, size)
+            tile.surface.blit(block, (0, 0), area)
+            tile.drawn_totals = list(totals)
+            self.tiles[(level, column, row)] = tile
+
+    def get_tile(self, level, column, row):
+        key = (level, column, row)
+        tile = self.tiles.pop(key)
+        self.tiles[key] = tile
+        while len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def repair_tiles(self, tiles, traces, scale):
+        # Clears the stale parts of the (tile, tile_origin) tiles and draws the segments still in
+        # the traces there again, up to the points the rest of each tile shows. The stale parts
+        # are small, so the segments crossing them are picked exactly, from points computed once.
+        margin = 2  # Pixels, for anti-aliasing
+        areas = []  # (tile, tile_origin, clip rectangle, viewport in trace coordinates)
+        for tile, tile_origin in tiles:
+            stale, tile.stale = tile.stale, []
+            if len(tile.drawn_totals) != len(traces):
+                continue
+            for bounds in stale:
+                left = math.floor(bounds[0] * scale + tile_origin[0]) - margin
+                top = math.floor(bounds[1] * scale + tile_origin[1]) - margin
+                right = math.ceil(bounds[2] * scale + tile_origin[0]) + margin
+                bottom = math.ceil(bounds[3] * scale + tile_origin[1]) + margin
+                area = pygame.Rect(left, top, right - left, bottom - top).clip(tile.surface.get_rect())
+                if area.width > 0 and area.height > 0:
+                    viewport = ((area.left - margin - tile_origin[0]) / scale, (area.top - margin - tile_origin[1]) / scale,
+                                (area.right + margin - tile_origin[0]) / scale,
+                                (area.bottom + margin - tile_origin[1]) / scale)
+                    areas.append((tile, tile_origin, area, viewport))
+        if not areas:
+            return
+
+        segments = []  # Per trace: points, their absolute indices, and the box of each segment
+        for idx, (trace, _) in enumerate(traces):
+            stop = max(tile.drawn_totals[idx] for tile, _, _, _ in areas)
+            runs = trace.index.visible_runs(trace.first_index(), stop, [viewport for _, _, _, viewport in areas])
+            points, offsets = trace.runs(runs)
+            starts = np.array([start for start, _ in runs], dtype=np.int64)
+            indices = np.arange(len(points)) + np.repeat(starts - offsets[:-1], np.diff(offsets))
+            segments.append((points, indices, np.minimum(points[:-1], points[1:]), np.maximum(points[:-1], points[1:])))
+
+        for tile, tile_origin, area, viewport in areas:
+            tile.surface.set_clip(area)
+            tile.surface.fill(self.background)
+            for (trace, color), (points, indices, low, high), drawn_total in zip(traces, segments, tile.drawn_totals):
+                crossing = np.flatnonzero((indices[1:] == indices[:-1] + 1) & (indices[1:] < drawn_total) &
+                                          (low[:, 0] <= viewport[2]) & (high[:, 0] >= viewport[0]) &
+                                          (low[:, 1] <= viewport[3]) & (high[:, 1] >= viewport[1]))
+                if len(crossing) == 0:
+                    continue
+                # Consecutive crossing segments are drawn as one polyline, all projected together
+                breaks = np.flatnonzero(np.diff(crossing) != 1) + 1
+                firsts = crossing[np.concatenate(([0], breaks))]
+                lengths = crossing[np.concatenate((breaks - 1, [len(crossing) - 1]))] + 2 - firsts
+                offsets = np.concatenate(([0], np.cumsum(lengths)))
+                selected = np.arange(offsets[-1]) + np.repeat(firsts - offsets[:-1], lengths)
+                screen_points = (points[selected] * scale + tile_origin).tolist()
+                for first, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+                    pygame.draw.aalines(tile.surface, color, False, screen_points[first:stop], 1)
+            tile.surface.set_clip(None)
+
+    def update_tile(self, tile, traces, scale, tile_origin):
+        # Draws the segments added since the tile was last used that may cross it
+        if len(tile.drawn_totals) != len(traces):
+            tile.drawn_totals = [0] * len(traces)
+        margin = 1  # Pixels, for anti-aliasing
+        viewport = ((-margin - tile_origin[0]) / scale, (-margin - tile_origin[1]) / scale,
+                    (self.tile_size + margin - tile_origin[0]) / scale,
+                    (self.tile_size + margin - tile_origin[1]) / scale)
+        for idx, (trace, color) in enumerate(traces):
+            drawn_total = tile.drawn_totals[idx]
+            if trace.total <= drawn_total:
+                continue
+            # Start one point early so the new segments join the ones already drawn
+            first = max(drawn_total - 1, trace.first_index())
+            runs = trace.index.visible_runs(first, trace.total, viewport)
+            if runs:
+                points, offsets = trace.runs(runs)
+                simplified, offsets = decimate_runs(points, offsets, scale, self.tolerance)
+                screen_points = (simplified * scale + tile_origin).tolist()
+                for start, stop in zip(offsets[:-1], offsets[1:]):
+                    if stop - start > 1:
+                        pygame.draw.aalines(tile.surface, color, False, screen_points[start:stop], 1)
+            tile.drawn_totals[idx] = trace.total
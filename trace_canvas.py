@@ -0,0 +1,141 @@
+# trace_canvas.py
+
+import time
+import pygame
+from constants import Constants
+from trace_lod import TraceSimplifier, decimate_runs
+
+class TraceCanvas:
+    def __init__(self, size, background=Constants.BLACK, tile_cache=None):
+        self.surface = pygame.Surface(size)
+        self.background = background
+        self.tile_cache = tile_cache  # Optional TileCache used to rebuild the surface
+        self.traces = []  # Traces drawn on the surface
+        self.drawn_totals = []  # Trace total already drawn, per trace
+        self.valid = False
+        self.simplifier = TraceSimplifier()
+        # Copies of the surface with the traces drawn up to fewer points, oldest first, as
+        # (totals, surface). Playing backwards goes back to one of them and draws the few
+        # points after it, instead of drawing the whole trace again.
+        self.checkpoints = []
+        self.kept_totals = None  # Points per trace left since the last update, if any were removed
+        self.profiler = None  # Optional FrameProfiler timing projection and aalines
+
+    def invalidate(self):
+        # Call whenever the projection (scale, view_offset) or the set of traces changes
+        self.valid = False
+
+    def reset(self):
+        # Call when points were removed from the traces, which erases them from the cached tiles too
+        self.valid = False
+        if self.tile_cache is not None:
+            self.tile_cache.clear()
+
+    def truncate(self, bounds):
+        # Call when the newest points were removed from the traces; bounds is the box
+        # (min x, min y, max x, max y) in trace coordinates holding the removed segments,
+        # or None if it is not known. Cached tiles and simplified levels are cut back rather
+        # than rebuilt, so scrubbing and playing backwards stay cheap on long traces.
+        self.simplifier.truncate()
+        if self.tile_cache is not None:
+            if bounds is None:
+                self.tile_cache.clear()
+            else:
+                self.tile_cache.truncate(bounds)
+        kept_totals = self.drawn_totals if self.kept_totals is None else self.kept_totals
+        self.kept_totals = [min(kept, trace.total) for kept, trace in zip(kept_totals, self.traces)]
+
+    def update(self, traces, to_screen, scale, viewport=None, origin=None):
+        # traces is a list of (PositionTrace, color); to_screen projects an (n, 2) array to screen points
+        # drawn at the given scale, putting trace point (0, 0) at origin; viewport is the visible
+        # (min x, min y, max x, max y) in trace coordinates, used to skip off-screen parts of the
+        # trace on a full redraw
+        if not self.valid or len(self.drawn_totals) != len(traces):
+            self.surface.fill(self.background)
+            if self.tile_cache is not None and origin is not None:
+                # Rebuild from cached tiles, which are brought up to date as they are composed
+                self.tile_cache.compose(self.surface, traces, scale, origin, self.rasterize)
+            else:
+                self.rasterize(self.surface, traces, scale, to_screen, viewport)
+            self.traces = [trace for trace, _ in traces]
+            self.drawn_totals = [trace.total for trace, _ in traces]
+            self.valid = True
+            self.checkpoints = []
+            self.kept_totals = None
+
+        if self.kept_totals is not None:
+            # Points were removed: go back to the newest copy without them
+            self.checkpoints = [(totals, surface) for totals, surface in self.checkpoints
+                                if all(total <= kept for total, kept in zip(totals, self.kept_totals))]
+            if self.checkpoints:
+                totals, surface = self.checkpoints[-1]
+                self.surface.blit(surface, (0, 0))
+            else:
+                # Start over from a few checkpoint intervals back, which are then drawn
+                # again below and checkpointed along the way
+                back = (Constants.TRACE_CHECKPOINTS - 1) * Constants.TRACE_CHECKPOINT_INTERVAL
+                totals = [max(kept - back, trace.first_index()) for kept, (trace, _) in zip(self.kept_totals, traces)]
+                self.surface.fill(self.background)
+                self.rasterize(self.surface, traces, scale, to_screen, viewport, totals)
+            self.drawn_totals = list(totals)
+            self.kept_totals = None
+
+        # Only the segments added since the last update are drawn, in steps of at most a
+        # checkpoint interval. Points the ring buffer has since dropped stay on the surface
+        # until the next rebuild.
+        while any(trace.total > drawn_total for (trace, _), drawn_total in zip(traces, self.drawn_totals)):
+            self.add_checkpoint()
+            for idx, (trace, color) in enumerate(traces):
+                drawn_total = self.drawn_totals[idx]
+                stop = min(trace.total, drawn_total + Constants.TRACE_CHECKPOINT_INTERVAL)
+                if stop <= drawn_total:
+                    continue
+                # Include the last drawn point so the new segments join the existing line
+                start = drawn_total - 1 if drawn_total > 0 else drawn_total
+                self.draw_polyline(self.surface, trace.range(start, stop), color, to_screen)
+                self.drawn_totals[idx] = stop
+
+    def add_checkpoint(self):
+        # Copies the surface once the traces have grown by a checkpoint interval since the last copy
+        if self.checkpoints:
+            totals, _ = self.checkpoints[-1]
+            if all(drawn - total < Constants.TRACE_CHECKPOINT_INTERVAL for drawn, total in zip(self.drawn_totals, totals)):
+                return
+        self.checkpoints.append((list(self.drawn_totals), self.surface.copy()))
+        del self.checkpoints[:-Constants.TRACE_CHECKPOINTS]
+
+    def rasterize(self, surface, traces, scale, to_screen, viewport=None, stops=None):
+        # Draws the whole of every trace onto surface, or only its points before the
+        # absolute index in stops
+        for idx, (trace, color) in enumerate(traces):
+            stop = trace.total if stops is None else stops[idx]
+            runs = None
+            if viewport is not None:
+                runs = trace.index.visible_runs(trace.first_index(), stop, viewport)
+            if runs is None or sum(end - start for start, end in runs) > len(trace) // 2:
+                # Most of the trace may be visible anyway: draw all of it, with
+                # sub-pixel detail dropped first
+                self.draw_polyline(surface, self.simplifier.simplified(trace, scale, stop), color, to_screen)
+                continue
+            # Zoomed in or panned: only the runs of segments that may be visible, all
+            # computed and simplified in one batch
+            points, offsets = trace.runs(runs)
+            simplified, offsets = decimate_runs(points, offsets, scale, self.simplifier.tolerance)
+            self.draw_polylines(surface, simplified, offsets, color, to_screen)
+
+    def draw_polyline(self, surface, points, color, to_screen):
+        self.draw_polylines(surface, points, (0, len(points)), color, to_screen)
+
+    def draw_polylines(self, surface, points, offsets, color, to_screen):
+        # Draws polyline k from points[offsets[k]:offsets[k + 1]] for every k, projected together
+        if len(points) < 2:
+            return
+        start = time.perf_counter()
+        screen_points = to_screen(points)
+        projected = time.perf_counter()
+        for first, stop in zip(offsets[:-1], offsets[1:]):
+            if stop - first > 1:
+                pygame.draw.aalines(surface, color, False, screen_points[first:stop], 1)
+        if self.profiler is not None:
+            self.profiler.add('transform', projected - start)
+            self.profiler.add('aalines', time.perf_counter() - projected)
@@ -0,0 +1,146 @@
+# trace_exporter.py
+
+import queue
+import struct
+import threading
+import time
+from collections import deque
+import numpy as np
+from constants import Constants
+
+# Binary layout: MAGIC, then one record per chunk: trace number (0 is the endpoint,
+# k the joint between lines k and k + 1), point count n and the absolute index of the
+# first point as '<IIq', followed by n little-endian float64 times and n (x, y) pairs.
+# A record with trace number RESTART_RECORD and no points marks a restart: the trace was
+# cut back (by seeking backwards, playing in reverse or starting over) so that only the
+# points before its index are left, and the points that follow replace the ones after it.
+MAGIC = b'SPINTRC1'
+CHUNK_HEADER = struct.Struct('<IIq')
+RESTART_RECORD = 0xFFFFFFFF
+RESTART = -1  # Trace number of restarts as read back, and in the trace column of CSV exports
+
+class TraceExporter(threading.Thread):
+    def __init__(self, path, queue_size=Constants.EXPORT_QUEUE_SIZE, flush_interval=1.0):
+        # Writes CSV for a .csv path and the binary format otherwise
+        super().__init__(daemon=True)
+        self.path = path
+        self.csv = path.lower().endswith('.csv')
+        self.flush_interval = flush_interval  # Seconds between flushes to disk
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.pending = deque()  # Chunks waiting for room in the queue, oldest first
+        self.max_pending = queue_size
+        self.file = open(path, 'w' if self.csv else 'wb')
+        if self.csv:
+            self.file.write("trace,index,time,x,y\n")
+        else:
+            self.file.write(MAGIC)
+
+        # Counted on the submitting thread
+        self.submitted_chunks = 0
+        self.delayed_chunks = 0  # Queue was full, so the chunk waited for a later submit
+        self.dropped_chunks = 0  # Waited too long and was discarded
+        self.dropped_points = 0
+        # Counted on the writer thread
+        self.written_chunks = 0
+        self.written_points = 0
+
+    def submit(self, trace_number, first_index, times, points):
+        # Hands a batch of new points (1-D complex array) to the writer without blocking
+        self.submitted_chunks += 1
+        self.pending.append((trace_number, first_index, times, points))
+        self.hand_over()
+        if self.pending:
+            self.delayed_chunks += 1  # The queue is FIFO, so this chunk is among the pending ones
+        while len(self.pending) > self.max_pending:
+            oldest = next((position for position, (_, _, times, _) in enumerate(self.pending)
+                           if times is not None), None)
+            if oldest is None:
+                break
+            _, _, dropped_times, _ = self.pending[oldest]
+            del self.pending[oldest]
+            self.dropped_chunks += 1
+            self.dropped_points += len(dropped_times)
+
+    def hand_over(self):
+        # Moves pending chunks to the queue while it has room
+        while self.pending:
+            try:
+                self.queue.put_nowait(self.pending[0])
+            except queue.Full:
+                break
+            self.pending.popleft()
+
+    def restart(self, index):
+        # Marks that the traces were cut back to the points before index. Restarts are never
+        # dropped, as the points written after them would otherwise look like duplicates.
+        if self.pending and self.pending[-1][2] is None:
+            # Back to back restarts, as when playing backwards while the writer is behind
+            index = min(index, self.pending.pop()[1])
+        self.pending.append((RESTART, index, None, None))
+        self.hand_over()
+
+    def run(self):
+        last_flush = time.perf_counter()
+        while True:
+            try:
+                chunk = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                chunk = ()
+            if chunk is None:
+                break
+            if chunk:
+                self.write_chunk(*chunk)
+            if time.perf_counter() - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = time.perf_counter()
+        self.file.close()
+
+    def write_chunk(self, trace_number, first_index, times, points):
+        if times is None:
+            # Restart: no time or position
+            if self.csv:
+                self.file.write(f"{RESTART},{first_index},nan,nan,nan\n")
+            else:
+                self.file.write(CHUNK_HEADER.pack(RESTART_RECORD, 0, first_index))
+            return
+        n = len(times)
+        if self.csv:
+            indices = np.arange(first_index, first_index + n)
+            rows = np.column_stack((np.full(n, trace_number), indices, times, points.real, points.imag))
+            np.savetxt(self.file, rows, fmt=('%d', '%d', '%.17g', '%.17g', '%.17g'), delimiter=',')
+        else:
+            self.file.write(CHUNK_HEADER.pack(trace_number, n, first_index))
+            self.file.write(np.ascontiguousarray(times, dtype='<f8').data)
+            self.file.write(np.column_stack((points.real, points.imag)).astype('<f8').data)
+        self.written_chunks += 1
+        self.written_points += n
+
+    def close(self):
+        # Writes whatever is still queued, then reports what was exported
+        for chunk in self.pending:
+            self.queue.put(chunk)
+        self.pending.clear()
+        self.queue.put(None)
+        self.join()
+        print(f"Exported {self.written_points} points in {self.written_chunks} chunks to {self.path}; "
+              f"{self.delayed_chunks} chunks waited for the writer, "
+              f"{self.dropped_chunks} chunks ({self.dropped_points} points) were dropped.")
+
+def read_binary_export(path):
+    # Yields (trace number, first index, times, (n, 2) points) for every chunk of a binary export.
+    # Restarts are yielded as (RESTART, index, no times, no points): every point yielded before
+    # with an index at or after index was cut back from the trace.
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a trace export")
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            trace_number, n, first_index = CHUNK_HEADER.unpack(header)
+            if trace_number == RESTART_RECORD:
+                yield RESTART, first_index, np.empty(0), np.empty((0, 2))
+                continue
+            times = np.frombuffer(f.read(8 * n), dtype='<f8')
+            points = np.frombuffer(f.read(16 * n), dtype='<f8').reshape(n, 2)
+            yield trace_number, first_index, times, points
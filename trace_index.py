@@ -0,0 +1,92 @@
+# trace_index.py
+
+import numpy as np
+from constants import Constants
+
+def empty_bounds(count):
+    # min x, min y, max x, max y of an empty box
+    bounds = np.empty((count, 4), dtype=np.float64)
+    bounds[:, :2] = np.inf
+    bounds[:, 2:] = -np.inf
+    return bounds
+
+class TraceIndex:
+    def __init__(self, capacity, chunk_size=Constants.TRACE_CHUNK_SIZE):
+        # Chunk k holds the bounding box of points k * chunk_size to (k + 1) * chunk_size
+        # (absolute indices, both inclusive), so it bounds every segment starting in it
+        self.chunk_size = chunk_size
+        self.max_slots = capacity // chunk_size + 2  # Enough for every chunk the trace can hold
+        self.bounds = np.empty((0, 4), dtype=np.float64)  # Allocated once points are added
+        self.end_index = 0  # One past the newest point added
+
+    def add(self, first_index, points):
+        # points is an (n, 2) array whose first point has absolute index first_index
+        n = len(points)
+        if n == 0:
+            return
+        size = self.chunk_size
+        last_chunk = (first_index + n - 1) // size
+        if last_chunk >= len(self.bounds) and len(self.bounds) < self.max_slots:
+            # Chunks have not wrapped yet, so slot numbers stay valid after growing
+            grown = empty_bounds(min(self.max_slots, max(len(self.bounds) * 2, last_chunk + 1, 64)))
+            grown[:len(self.bounds)] = self.bounds
+            self.bounds = grown
+        slots = len(self.bounds)
+        self.end_index = max(self.end_index, first_index + n)
+
+        # Bounding box of the new points per chunk
+        indices = np.arange(first_index, first_index + n)
+        chunks = indices // size
+        starts = np.flatnonzero(np.concatenate(([True], chunks[1:] != chunks[:-1])))
+        new_bounds = np.hstack((np.minimum.reduceat(points, starts, axis=0),
+                                np.maximum.reduceat(points, starts, axis=0)))
+        chunk_slots = chunks[starts] % slots
+        if first_index % size != 0:
+            # The first chunk already holds older points
+            old = self.bounds[chunk_slots[0]]
+            new_bounds[0, :2] = np.minimum(new_bounds[0, :2], old[:2])
+            new_bounds[0, 2:] = np.maximum(new_bounds[0, 2:], old[2:])
+        self.bounds[chunk_slots] = new_bounds
+
+        # The first point of each chunk also closes the last segment of the chunk before it
+        boundaries = starts[(indices[starts] % size == 0) & (indices[starts] > 0)]
+        if len(boundaries):
+            previous = (chunks[boundaries] - 1) % slots
+            self.bounds[previous, :2] = np.minimum(self.bounds[previous, :2], points[boundaries])
+            self.bounds[previous, 2:] = np.maximum(self.bounds[previous, 2:], points[boundaries])
+
+    def visible_runs(self, first_index, end_index, viewport):
+        # Returns (start, stop) absolute index ranges (stop exclusive) of the points in
+        # [first_index, end_index) whose segments may cross viewport (min x, min y, max x, max y),
+        # or any of several viewports given as an (n, 4) array
+        if end_index - first_index < 2:
+            return []
+        size = self.chunk_size
+        chunks = np.arange(first_index // size, (end_index - 1) // size + 1)
+        bounds = self.bounds[chunks % len(self.bounds)]
+        viewports = np.asarray(viewport, dtype=np.float64).reshape(-1, 4)
+        visible = ((bounds[:, None, 0] <= viewports[:, 2]) & (bounds[:, None, 2] >= viewports[:, 0]) &
+                   (bounds[:, None, 1] <= viewports[:, 3]) & (bounds[:, None, 3] >= viewports[:, 1])).any(axis=1)
+        if not visible.any():
+            return []
+        # Group consecutive visible chunks into runs
+        edges = np.diff(np.concatenate(([False], visible, [False])).astype(np.int8))
+        run_starts = chunks[np.flatnonzero(edges == 1)]
+        run_ends = chunks[np.flatnonzero(edges == -1) - 1]
+        return [(max(start * size, first_index), min((end + 1) * size + 1, end_index))
+                for start, end in zip(run_starts.tolist(), run_ends.tolist())]
+
+    def range_bounds(self, first_index, end_index):
+        # Returns the box (min x, min y, max x, max y) holding the segments that start at the points
+        # in [first_index, end_index), or None if their chunks were since reused for newer points.
+        # Points dropped from the trace keep their chunks until then, so this also bounds them.
+        end_index = min(end_index, self.end_index)
+        if end_index <= first_index or len(self.bounds) == 0:
+            return (np.inf, np.inf, -np.inf, -np.inf)
+        size = self.chunk_size
+        slots = len(self.bounds)
+        first_chunk, last_chunk = first_index // size, (end_index - 1) // size
+        if first_chunk <= (self.end_index - 1) // size - slots:
+            return None
+        bounds = self.bounds[np.arange(first_chunk, last_chunk + 1) % slots]
+        return tuple(bounds[:, :2].min(axis=0).tolist() + bounds[:, 2:].max(axis=0).tolist())
@@ -0,0 +1,147 @@
+# trace_lod.py
+
+import weakref
+from collections import OrderedDict
+import numpy as np
+from constants import Constants
+
+def screen_cells(points, scale, tolerance=Constants.LOD_TOLERANCE):
+    # Screen-space cell of each point that decimate merges points within
+    cell_size = tolerance / (2 * np.sqrt(2))  # Cell diagonal is half the budget
+    return np.floor(points * (scale / cell_size)).astype(np.int64)
+
+def decimate(points, scale, tolerance=Constants.LOD_TOLERANCE, previous_cell=None, passes=4):
+    # Simplify a polyline so it stays within tolerance pixels of the original once drawn
+    # at scale. Returns the kept points and the cell of the last point.
+    kept, cell = decimate_indices(points, scale, tolerance, previous_cell, passes)
+    return points[kept], cell
+
+def decimate_indices(points, scale, tolerance=Constants.LOD_TOLERANCE, previous_cell=None, passes=4,
+                     fixed=None):
+    # Like decimate, but returns the positions in points of the kept points; points where
+    # the optional boolean mask fixed is set are always kept.
+    # Half of the budget goes to merging points that share a screen-space cell,
+    # the other half to dropping nearly collinear points. The first point and the cell of
+    # the last point are kept so that consecutive batches can be decimated separately.
+    if len(points) == 0:
+        return np.empty(0, dtype=np.int64), previous_cell
+    cells = screen_cells(points, scale, tolerance)
+    keep = np.empty(len(points), dtype=bool)
+    if previous_cell is None:
+        keep[0] = True
+    else:
+        keep[0] = bool(np.any(cells[0] != previous_cell))
+    keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+    if fixed is not None:
+        keep |= fixed
+    kept = np.flatnonzero(keep)
+    max_deviation = tolerance / (2 * passes * scale)
+    return kept[collinear_indices(points[kept], max_deviation, passes,
+                                  None if fixed is None else fixed[kept])], cells[-1]
+
+def decimate_runs(points, offsets, scale, tolerance=Constants.LOD_TOLERANCE):
+    # Decimates several polylines stored back to back, polyline k being
+    # points[offsets[k]:offsets[k + 1]], in one batch. Both ends of every polyline are kept.
+    # Returns the kept points and the offsets of the polylines in them.
+    offsets = np.asarray(offsets)
+    fixed = np.zeros(len(points), dtype=bool)
+    nonempty = offsets[1:] > offsets[:-1]
+    fixed[offsets[:-1][nonempty]] = True
+    fixed[offsets[1:][nonempty] - 1] = True
+    kept, _ = decimate_indices(points, scale, tolerance, fixed=fixed)
+    return points[kept], np.searchsorted(kept, offsets)
+
+def collinear_indices(points, max_deviation, passes, fixed=None):
+    # Each pass drops every other interior point lying within max_deviation of the chord
+    # between its neighbours, so the error grows by at most max_deviation per pass.
+    # The end points, and points where fixed is set, are always kept.
+    # Returns the positions of the points kept.
+    kept = np.arange(len(points))
+    for _ in range(passes):
+        if len(points) < 3:
+            break
+        previous, middle, following = points[0:-2:2], points[1:-1:2], points[2::2]
+        chord = following - previous
+        offset = middle - previous
+        chord_length = np.hypot(chord[:, 0], chord[:, 1])
+        cross = np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0])
+        # Degenerate chords fall back to the distance from the shared end point
+        deviation = np.where(chord_length > 0, cross / np.maximum(chord_length, 1e-300),
+                             np.hypot(offset[:, 0], offset[:, 1]))
+        # Also require the point to project inside the chord so turning points are kept
+        along = (chord * offset).sum(axis=1)
+        droppable = (deviation <= max_deviation) & (along >= 0) & (along <= chord_length ** 2)
+        if fixed is not None:
+            droppable &= ~fixed[1:-1:2]
+        if not droppable.any():
+            break
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:-1:2] = ~droppable
+        points = points[keep]
+        kept = kept[keep]
+        if fixed is not None:
+            fixed = fixed[keep]
+    return kept
+
+class TraceSimplifier:
+    def __init__(self, tolerance=Constants.LOD_TOLERANCE, max_levels=8):
+        self.tolerance = tolerance
+        self.max_levels = max_levels  # Zoom levels cached per trace, least recently used dropped first
+        self.levels = weakref.WeakKeyDictionary()  # Trace -> OrderedDict(scale -> level)
+
+    def simplified(self, trace, scale, stop=None):
+        # Returns the trace decimated for the given scale, oldest-first, ending at its newest
+        # point, or only its points before absolute index stop
+        levels = self.levels.setdefault(trace, OrderedDict())
+        key = round(scale, 6)
+        level = levels.pop(key, None)
+        first_index = trace.first_index()
+        if level is None or level['total'] > trace.total or level['total'] <= first_index:
+            view = trace.view()
+            kept, cell = decimate_indices(view, scale, self.tolerance)
+            points, indices = view[kept], kept + first_index
+        else:
+            points, indices = level['points'], level['indices']
+            if len(indices) and indices[0] < first_index:
+                # The ring buffer dropped the oldest points: cut the head of the level off and
+                # start it at the oldest point left
+                head = int(np.searchsorted(indices, first_index))
+                points, indices = points[head:], indices[head:]
+                if len(indices) == 0 or indices[0] != first_index:
+                    points = np.concatenate((trace.range(first_index, first_index + 1), points))
+                    indices = np.concatenate(([first_index], indices))
+            # Only the points appended since the level was built need decimating
+            new_points = trace.tail(trace.total - level['total'])
+            kept, cell = decimate_indices(new_points, scale, self.tolerance, level['cell'])
+            if len(kept):
+                points = np.concatenate((points, new_points[kept]))
+                indices = np.concatenate((indices, kept + level['total']))
+        # indices holds the absolute index of every kept point, so truncate can cut the level back
+        levels[key] = {'points': points, 'indices': indices, 'cell': cell, 'total': trace.total}
+        while len(levels) > self.max_levels:
+            levels.popitem(last=False)
+
+        last = trace.tail(1)
+        if stop is not None and stop < trace.total:
+            points = points[:np.searchsorted(indices, stop)]
+            last = trace.range(stop - 1, stop)
+        # The newest point is always drawn so incremental segments join up exactly
+        if len(last) and (len(points) == 0 or np.any(points[-1] != last[0])):
+            points = np.concatenate((points, last))
+        return points
+
+    def truncate(self):
+        # Call when the newest points were removed from the traces: every cached level is cut
+        # back to the points that are left instead of being decimated again from scratch
+        for trace, levels in self.levels.items():
+            last = None  # The newest point left, which the next batch continues from
+            for scale, level in levels.items():
+                if level['total'] <= trace.total:
+                    continue
+                if last is None:
+                    last = trace.tail(1)
+                cut = int(np.searchsorted(level['indices'], trace.total))
+                level['points'] = level['points'][:cut]
+                level['indices'] = level['indices'][:cut]
+                level['cell'] = screen_cells(last, scale, self.tolerance)[0] if len(last) else None
+                level['total'] = trace.total
@@ -1,12 +1,34 @@
 # visualization_app.py
 
 import sys  # Imported sys, which was missing before 
-import pygame
 import math
+import os
+import threading
+import pygame
+import numpy as np
 from constants import Constants
-from input_box import InputBox, ColorInput
+from epicycle_engine import EpicycleEngine, EpicycleBatch, substep_times
+from sample_trace import SampleTimes, PositionTrace
+from trace_canvas import TraceCanvas
+from tile_cache import TileCache
+from fading_trail import FadingTrail
+from text_cache import get_font, render_text
+from frame_profiler import FrameProfiler
+from simulation_worker import SimulationWorker
+from session_file import save_session, load_session
+from config_file import ConfigError, load_config, save_config
+from input_box import InputBox, ColorInput, parse_number, parse_color
 from button import Button
 from checkbox import CheckBox
+from hit_index import HitIndex
+
+def parse_joint_colors(texts):
+    # Parses each distinct colour text once; invalid colours are drawn white
+    colors = {}
+    for text in set(texts):
+        color = parse_color(text)
+        colors[text] = Constants.WHITE if color is None else color
+    return [colors[text] for text in texts]
 
 class VisualizationApp:
     def __init__(self, screen):
@@ -14,18 +36,48 @@ class VisualizationApp:
         self.mode = Constants.INPUT_MODE
         self.lengths = [150, 50]  # Starting with 2 lines
         self.speeds = [0.05, -0.15]
-        self.input_boxes = []  # List to hold tuples: ("label", surface, rect) or ("input", InputBox, None)
-        self.joints = []  # List to hold joint dictionaries
+        self.phases = [0.0, 0.0]  # Starting angle of each line in radians
+        self.length_texts = []  # Length of each line as typed on the input screen
+        self.speed_texts = []  # Speed of each line as typed on the input screen
+        self.joint_enabled = []  # Whether each joint between consecutive lines is traced
+        self.joint_color_texts = []  # Trace color of each joint as typed on the input screen
+        self.rows = []  # Widgets of the input screen rows on screen, rebound while scrolling
+        self.joint_colors = []  # Trace color of each joint, parsed once per visualization
         self.buttons = []
-        self.trace_points = []
-        self.joint_traces = []  # List to store the trace points of each joint
+        self.hit_index = HitIndex()  # Input screen widgets by screen position
+        self.focused_box = None  # Input box receiving key presses
+        self.hovered_widget = None  # Widget under the mouse
+        self.input_needs_full_redraw = True  # Otherwise only changed widgets are drawn
+        self.drawn_view_state = None  # view_state() of the last composed visualization frame
+        self.trace_capacity = Constants.TRACE_CAPACITY  # Maximum points kept per trace
+        self.trace_times = SampleTimes(self.trace_capacity)  # Every trace is computed from these
+        self.trace_points = None  # Trace of the last endpoint, created by start_visualization
+        self.joint_traces = {}  # Trace of each enabled joint by joint number
         self.paused = False
+        self.reverse = False  # Play the simulation backwards
         self.hidden = False  # Flag to track visibility of lines, joints, and texts
         self.speed_multiplier = 1.0  # Initial speed multiplier
         self.min_speed_multiplier = 0.1  # Hard limit for slowing down
         self.speed_factor = 1.1  # Factor by which speed is increased/decreased
         self.time = 0  # Initialize time variable
-        self.max_angular_increment = 0.1  # Maximum angular increment per sub-step (in radians)
+        self.max_pixel_error = 0.25  # Maximum on-screen distance between a trace chord and the true curve
+        self.max_substeps = 100000  # Hard limit on sub-steps per frame
+
+        # Timeline attributes
+        self.furthest_time = 0  # Latest time reached, the end of the timeline slider
+        self.seek_step = 60  # Frames of playback skipped by one seek key press
+        self.scrubbing = False  # Whether the timeline slider is being dragged
+        self.timeline_rect = pygame.Rect(10, Constants.HEIGHT - 70, Constants.WIDTH - 20, 6)
+        self.timeline_lock = threading.RLock()  # Keeps seeks and simulation ticks from interleaving
+
+        # Period detection attributes
+        self.period_tolerance = 1e-9  # Allowed rounding error when treating a speed as a rational number
+        # Longest period (in time units) worth waiting for before freezing; also the only
+        # cut-off for speed ratios that are irrational, see common_period
+        self.max_period = 1e6
+        self.period = None  # Common period of the arms, or None if the curve never closes
+        self.trace_end_time = None  # Time at which the trace has covered one full period
+        self.trace_frozen = False  # Whether the trace stopped growing
         
         # Flashing text attributes
         self.flashing_text_active = False
@@ -43,17 +95,64 @@ class VisualizationApp:
         self.view_offset = pygame.Vector2(0, 0)  # Current view offset (x, y)
         self.pan_speed = 10  # Speed at which the view pans per key press
         self.total_length = sum(self.lengths)  # Sum of all lengths from inputs
+
+        # Batched position engine shared by update and draw
+        self.engine = EpicycleEngine(self.lengths, self.speeds)
+
+        # Systems compared with the one configured on the input screen. They share its time,
+        # sample times, view and frame, and are evaluated together with it in self.batch.
+        self.compared_configs = []  # (name, lengths, speeds, phases, joints) per compared system
+        self.compared_systems = []  # Engine, traces and colours per compared system, built by start_visualization
+        self.batch = EpicycleBatch([self.engine])
+        self.layout = Constants.GRID_LAYOUT  # Compared systems side by side, or overlaid
+        self.grid_canvases = []  # Trace surface of every grid cell, the edited system first
+
+        # Off-screen surface holding the already drawn traces
+        self.trace_canvas = TraceCanvas(self.screen.get_size(), tile_cache=TileCache())
+
+        # Fading-trail mode draws onto this instead of keeping a trace, when set
+        self.fading_trail = None
+
+        # Per-frame phase timings, optional overlay and metrics log
+        self.profiler = FrameProfiler()
+        self.trace_canvas.profiler = self.profiler
+
+        # Joint marker, drawn once and blitted in a single batch per frame
+        self.joint_sprite = pygame.Surface((7, 7), pygame.SRCALPHA)
+        pygame.draw.circle(self.joint_sprite, Constants.LIGHT_BLUE, (3, 3), 3)  # Smaller radius for smoothness
+
+        # Background simulation attributes
+        self.threaded_simulation = False  # Run the simulation on a worker thread at a fixed rate
+        self.simulation_worker = None
+        self.simulation_lock = threading.Lock()  # Guards the traces while they are appended or drawn
+
+        # Optional TraceExporter streaming every new trace point to disk
+        self.exporter = None
+        self.exported_total = 0  # Trace total after the last points handed to the exporter
+
+        # Session file the visualization is saved to when leaving it, if any
+        self.session_path = None
+
+        # Configuration file the C key exports to
+        self.config_path = 'configuration.json'
         
         self.initialize_input_screen()
 
     def initialize_input_screen(self):
-        self.input_boxes = []
-        self.joints = []
+        # The configuration lives in plain lists; only the rows on screen have widgets,
+        # which are rebound to other lines while scrolling
+        self.length_texts = [str(length) for length in self.lengths]
+        self.speed_texts = [str(speed) for speed in self.speeds]
+        self.phases = (list(self.phases) + [0.0] * len(self.lengths))[:len(self.lengths)]  # Not shown on screen
+        self.joint_enabled = [False] * max(len(self.lengths) - 1, 0)  # Joint k sits between lines k and k + 1
+        self.joint_color_texts = ['#FF0000'] * max(len(self.lengths) - 1, 0)  # Default to red for visibility
+        self.first_line = 0  # Line shown in the top row
+        self.focused_box = None
+        self.hovered_widget = None
         self.buttons = []
 
         # Define layout parameters for centering and spacing
         start_y = 50  # Starting Y position for "Start Visualization" button
-        spacing_y = 60  # Vertical spacing between rows
 
         # Add 'Start Visualization' button at the top
         start_button = Button(
@@ -88,255 +187,516 @@ class VisualizationApp:
         )
         self.buttons.extend([add_button, remove_button])
 
-        # Define input fields starting position
-        input_start_y = buttons_y + 60  # Start below the buttons
-        input_spacing_y = 60  # Space between each line's input fields
-
-        # Add input boxes for existing lines
-        for i in range(len(self.lengths)):
-            y_pos = input_start_y + i * input_spacing_y
-
-            # Line label
-            line_label = pygame.font.SysFont(None, Constants.FONT_SIZE).render(f"Line {i+1}:", True, Constants.WHITE)
-            line_label_rect = line_label.get_rect()
-            line_label_rect.topleft = (Constants.WIDTH // 2 - 300, y_pos + 8)
-            self.input_boxes.append(("label", line_label, line_label_rect))
-
-            # Length input box
-            length_box = InputBox(
-                x=Constants.WIDTH // 2 - 200,
-                y=y_pos,
-                w=100,
-                h=32,
-                placeholder='Length',
-                unit='pixels'
-            )
-            length_box.text = str(self.lengths[i])
-            length_box.txt_surface = length_box.font.render(length_box.text, True, Constants.WHITE)
-            self.input_boxes.append(("input", length_box, None))
-
-            # Speed input box (Adjusted X-coordinate to fix overlapping)
-            speed_box = InputBox(
-                x=Constants.WIDTH // 2,
-                y=y_pos,
-                w=100,
-                h=32,
-                placeholder='Speed',
-                unit='rad/frame'
-            )
-            speed_box.text = str(self.speeds[i])
-            speed_box.txt_surface = speed_box.font.render(speed_box.text, True, Constants.WHITE)
-            self.input_boxes.append(("input", speed_box, None))
-
-            # If not the first line, add a joint above this line
-            if i > 0:
-                joint_y = y_pos - input_spacing_y // 2
-                joint_checkbox = CheckBox(
+        # Scrolling area holding the rows, below the buttons and above the footer
+        list_top = buttons_y + 50
+        footer_height = 30
+        self.list_rect = pygame.Rect(0, list_top, Constants.WIDTH, Constants.HEIGHT - list_top - footer_height)
+        self.row_spacing = 60  # Space between each line's input fields
+        # A row is a line's label and inputs with the joint above it, which takes the first half of the spacing
+        visible_rows = (self.list_rect.height - self.row_spacing // 2 - 32) // self.row_spacing + 1
+
+        self.rows = []
+        self.row_widgets = {}  # Widget -> (field, row)
+        for k in range(visible_rows):
+            y_pos = list_top + self.row_spacing // 2 + k * self.row_spacing
+            joint_y = y_pos - self.row_spacing // 2
+            row = {
+                'line': None,  # Index of the line shown, or None if the row is unused
+                'y': y_pos,
+                # Length input box
+                'length_box': InputBox(
+                    x=Constants.WIDTH // 2 - 200,
+                    y=y_pos,
+                    w=100,
+                    h=32,
+                    placeholder='Length',
+                    unit='pixels'
+                ),
+                # Speed input box (Adjusted X-coordinate to fix overlapping)
+                'speed_box': InputBox(
+                    x=Constants.WIDTH // 2,
+                    y=y_pos,
+                    w=100,
+                    h=32,
+                    placeholder='Speed',
+                    unit='rad/frame'
+                ),
+                # Joint above this line, unused on the first line
+                'checkbox': CheckBox(
                     x=Constants.WIDTH // 2 - 300,
                     y=joint_y,
                     size=20,
                     checked=False
-                )
-                joint_color_input = ColorInput(
+                ),
+                'color_input': ColorInput(
                     x=Constants.WIDTH // 2 - 250,
                     y=joint_y,
                     w=100,
                     h=32,
-                    placeholder='#FF0000',  # Default to red for visibility
+                    placeholder='#FF0000',
                     unit=''
-                )
-                self.joints.append({
-                    'checkbox': joint_checkbox,
-                    'color_input': joint_color_input
-                })
-                self.input_boxes.append(("joint_checkbox", joint_checkbox, None))
-                self.input_boxes.append(("joint_color", joint_color_input, None))
+                ),
+            }
+            for field in ('length_box', 'speed_box', 'checkbox', 'color_input'):
+                self.row_widgets[row[field]] = (field, row)
+            self.rows.append(row)
+
+        self.joint_traces = {}  # Created by start_visualization
+        self.bind_rows()
+
+    def bind_rows(self):
+        # Show the lines from first_line on in the row widgets; call whenever lines are
+        # added or removed or the list scrolls
+        line_count = len(self.length_texts)
+        max_first_line = max(line_count - len(self.rows), 0)
+        self.first_line = max(0, min(self.first_line, max_first_line))
+        if self.focused_box is not None:
+            # The focused box is about to show another line
+            self.focused_box.active = False
+            self.focused_box.color = Constants.GRAY
+            self.focused_box = None
+        for k, row in enumerate(self.rows):
+            line = self.first_line + k
+            row['line'] = line if line < line_count else None
+            if row['line'] is None:
+                continue
+            row['length_box'].set_text(self.length_texts[line])
+            row['speed_box'].set_text(self.speed_texts[line])
+            if line > 0:
+                row['checkbox'].checked = self.joint_enabled[line - 1]
+                row['color_input'].set_text(self.joint_color_texts[line - 1])
+        self.rebuild_hit_index()
+
+    def rebuild_hit_index(self):
+        # Call whenever input screen widgets are shown, hidden or rebound
+        self.hit_index.clear()
+        for row in self.rows:
+            if row['line'] is None:
+                continue
+            fields = ('checkbox', 'color_input', 'length_box', 'speed_box') if row['line'] > 0 else ('length_box', 'speed_box')
+            for field in fields:
+                self.hit_index.add(row[field])
+        for button in self.buttons:
+            self.hit_index.add(button)
+        if self.hovered_widget not in self.hit_index.widgets:
+            self.hovered_widget = None
+        self.input_needs_full_redraw = True
 
-        # Initialize joint_traces
-        self.joint_traces = [[] for _ in self.joints]
+    def store_widget_value(self, widget):
+        # Copy an edited widget of a row back into the configuration lists
+        field, row = self.row_widgets[widget]
+        line = row['line']
+        if field == 'length_box':
+            self.length_texts[line] = widget.text
+        elif field == 'speed_box':
+            self.speed_texts[line] = widget.text
+        elif field == 'checkbox':
+            self.joint_enabled[line - 1] = widget.checked
+        elif field == 'color_input':
+            self.joint_color_texts[line - 1] = widget.text
+
+    def scroll_lines(self, count):
+        max_first_line = max(len(self.length_texts) - len(self.rows), 0)
+        first_line = max(0, min(self.first_line + count, max_first_line))
+        if first_line != self.first_line:
+            self.first_line = first_line
+            self.bind_rows()
 
     def add_line(self):
         new_length = 50
         new_speed = 0.02
-
-        # Define layout parameters
-        input_start_y = 50 + 60 + 60  # start_y + buttons_y + spacing
-        input_spacing_y = 60  # Space between each line's input fields
-        i = len(self.lengths)  # New line index
-
-        y_pos = 170 + i * input_spacing_y  # 50(start_y) +60(buttons_y)+60(first line) =170
-
-        # Line label
-        line_label = pygame.font.SysFont(None, Constants.FONT_SIZE).render(f"Line {i+1}:", True, Constants.WHITE)
-        line_label_rect = line_label.get_rect()
-        line_label_rect.topleft = (Constants.WIDTH // 2 - 300, y_pos + 8)
-        self.input_boxes.append(("label", line_label, line_label_rect))
-
-        # Length input box
-        length_box = InputBox(
-            x=Constants.WIDTH // 2 - 200,
-            y=y_pos,
-            w=100,
-            h=32,
-            placeholder='Length',
-            unit='pixels'
-        )
-        length_box.text = str(new_length)
-        length_box.txt_surface = length_box.font.render(length_box.text, True, Constants.WHITE)
-        self.input_boxes.append(("input", length_box, None))
-
-        # Speed input box (Adjusted X-coordinate to fix overlapping)
-        speed_box = InputBox(
-            x=Constants.WIDTH // 2,
-            y=y_pos,
-            w=100,
-            h=32,
-            placeholder='Speed',
-            unit='rad/frame'
-        )
-        speed_box.text = str(new_speed)
-        speed_box.txt_surface = speed_box.font.render(speed_box.text, True, Constants.WHITE)
-        self.input_boxes.append(("input", speed_box, None))
-
-        # Add joint for the new line if it's not the first line
-        if i > 0:
-            joint_y = y_pos - input_spacing_y // 2
-            joint_checkbox = CheckBox(
-                x=Constants.WIDTH // 2 - 300,
-                y=joint_y,
-                size=20,
-                checked=False
-            )
-            joint_color_input = ColorInput(
-                x=Constants.WIDTH // 2 - 250,
-                y=joint_y,
-                w=100,
-                h=32,
-                placeholder='#FF0000',  # Default to red for visibility
-                unit=''
-            )
-            self.joints.append({
-                'checkbox': joint_checkbox,
-                'color_input': joint_color_input
-            })
-            self.input_boxes.append(("joint_checkbox", joint_checkbox, None))
-            self.input_boxes.append(("joint_color", joint_color_input, None))
-
-            # Initialize a new joint trace
-            self.joint_traces.append([])
+        if self.length_texts:
+            # Add joint for the new line if it's not the first line
+            self.joint_enabled.append(False)
+            self.joint_color_texts.append('#FF0000')
+        self.length_texts.append(str(new_length))
+        self.speed_texts.append(str(new_speed))
+        self.phases.append(0.0)
 
         # Update lengths and speeds lists
         self.lengths.append(new_length)
         self.speeds.append(new_speed)
         self.total_length = sum(self.lengths)  # Update total_length
+        self.first_line = len(self.length_texts)  # Scroll to the new line
+        self.bind_rows()
 
     def remove_line(self):
-        if len(self.lengths) > 0:
-            # Remove the last set of input boxes (label, length, speed)
-            for _ in range(3):
-                if self.input_boxes:
-                    self.input_boxes.pop()
+        if len(self.length_texts) > 0:
+            self.length_texts.pop()
+            self.speed_texts.pop()
+            self.phases.pop()
             # If there is a joint above this line, remove it
-            if len(self.joints) > 0:
-                # Remove joint checkbox and color input from input_boxes
-                for _ in range(2):
-                    if self.input_boxes:
-                        self.input_boxes.pop()
-                # Remove the joint and its trace
-                self.joints.pop()
-                if self.joint_traces:
-                    self.joint_traces.pop()
+            if self.joint_enabled:
+                self.joint_enabled.pop()
+                self.joint_color_texts.pop()
             # Remove from lengths and speeds
-            self.lengths.pop()
-            self.speeds.pop()
+            if self.lengths:
+                self.lengths.pop()
+                self.speeds.pop()
             self.total_length = sum(self.lengths)  # Update total_length
+            self.bind_rows()
         else:
             print("No more lines to remove.")
 
+    def load_configuration(self, lengths, speeds, joints=(), phases=None):
+        # Fill the configuration and start the visualization.
+        # joints holds an (enabled, color) pair per joint between consecutive lines.
+        self.lengths = list(lengths)
+        self.speeds = list(speeds)
+        self.phases = list(phases) if phases is not None else [0.0] * len(self.lengths)
+        self.initialize_input_screen()
+        for idx, (enabled, color) in zip(range(len(self.joint_enabled)), joints):
+            self.joint_enabled[idx] = enabled
+            self.joint_color_texts[idx] = color
+        self.start_visualization()
+        return self.mode == Constants.VISUALIZE_MODE
+
     def start_visualization(self):
+        self.stop_simulation_worker()
         # Gather inputs
         lengths = []
         speeds = []
-        for item in self.input_boxes:
-            if item[0] == "input":
-                box = item[1]
-                if 'pixels' in box.unit:
-                    length = box.get_value()
-                    if length is None or length <= 0:
-                        print("Invalid length input detected. Please enter valid positive numbers.")
-                        return
-                    lengths.append(length)
-                elif 'rad/frame' in box.unit:
-                    speed = box.get_value()
-                    if speed is None:
-                        print("Invalid speed input detected. Please enter valid numbers.")
-                        return
-                    speeds.append(speed)
+        for text in self.length_texts:
+            length = parse_number(text)
+            if length is None or length <= 0:
+                print("Invalid length input detected. Please enter valid positive numbers.")
+                return
+            lengths.append(length)
+        for text in self.speed_texts:
+            speed = parse_number(text)
+            if speed is None:
+                print("Invalid speed input detected. Please enter valid numbers.")
+                return
+            speeds.append(speed)
         if not lengths or not speeds or len(lengths) != len(speeds):
             print("Mismatch in the number of lengths and speeds. Please check your inputs.")
             return
         self.lengths = lengths
         self.speeds = speeds
-        self.trace_points = []
-        self.joint_traces = [[] for _ in self.joints]  # Initialize joint traces
+        self.engine.set_config(self.lengths, self.speeds, self.phases)
+        self.joint_colors = parse_joint_colors(self.joint_color_texts)
+        self.build_compared_systems()
+        self.trace_times = SampleTimes(self.trace_capacity)
+        self.create_traces()
         self.paused = False
+        self.reverse = False
+        self.scrubbing = False
         self.hidden = False  # Reset hidden state when starting visualization
         self.speed_multiplier = 1.0  # Reset speed multiplier
         self.time = 0  # Reset time when starting a new visualization
+        self.furthest_time = 0
+        self.period = self.batch.period(self.period_tolerance, max_period=self.max_period)
+        self.trace_end_time = None
+        self.trace_frozen = False
         self.scale = 1.0  # Reset zoom level
         self.view_offset = pygame.Vector2(0, 0)  # Reset panning
+        self.invalidate_canvases()
+        if self.fading_trail is not None:
+            self.fading_trail.clear()
+        self.drawn_view_state = None
         self.total_length = sum(self.lengths)  # Update total_length
         self.mode = Constants.VISUALIZE_MODE
+        if self.threaded_simulation:
+            self.simulation_worker = SimulationWorker(self)
+            self.simulation_worker.start()
+
+    def build_compared_systems(self):
+        self.compared_systems = []
+        for number, (name, lengths, speeds, phases, joints) in enumerate(self.compared_configs):
+            self.compared_systems.append({
+                'name': name,
+                'engine': EpicycleEngine(lengths, speeds, phases),
+                'joint_enabled': [enabled for enabled, _ in joints],
+                'joint_colors': parse_joint_colors([color for _, color in joints]),
+                'color': Constants.SYSTEM_COLORS[number % len(Constants.SYSTEM_COLORS)],
+            })
+        self.batch = EpicycleBatch([self.engine] + [system['engine'] for system in self.compared_systems])
+        cells = self.grid_cells()
+        self.grid_canvases = [TraceCanvas(cell.size) for cell in cells] if len(cells) > 1 else []
+        for canvas in self.grid_canvases:
+            canvas.profiler = self.profiler
+
+    def create_traces(self):
+        # Traces only hold the engine and the sample times, so any of them can be created
+        # at any point and still show the whole history
+        self.trace_points = PositionTrace(self.trace_times, self.engine, self.engine.arm_count)
+        self.joint_traces = {idx: PositionTrace(self.trace_times, self.engine, idx + 1)
+                             for idx, enabled in enumerate(self.joint_enabled) if enabled}
+        for system in self.compared_systems:
+            engine = system['engine']
+            system['trace_points'] = PositionTrace(self.trace_times, engine, engine.arm_count)
+            system['joint_traces'] = {idx: PositionTrace(self.trace_times, engine, idx + 1)
+                                      for idx, enabled in enumerate(system['joint_enabled']) if enabled}
+
+    def systems(self):
+        # Every system on screen, the one configured on the input screen first
+        edited = {
+            'name': None,
+            'engine': self.engine,
+            'joint_colors': self.joint_colors,
+            'color': Constants.DRAW_COLOR,
+            'trace_points': self.trace_points,
+            'joint_traces': self.joint_traces,
+        }
+        return [edited, *self.compared_systems]
+
+    def invalidate_canvases(self, reset=False):
+        # reset when points were removed from the traces, see TraceCanvas.reset
+        for canvas in [self.trace_canvas, *self.grid_canvases]:
+            if reset:
+                canvas.reset()
+            else:
+                canvas.invalidate()
+
+    def compare_configuration(self, path):
+        # Show the configuration in the file next to (or over) the one being edited
+        try:
+            lengths, speeds, phases, joints = load_config(path)
+        except (OSError, ConfigError) as error:
+            print(f"Could not load configuration: {error}")
+            return False
+        self.compared_configs.append((os.path.basename(path), lengths, speeds, phases, joints))
+        print(f"Comparing with {path} ({len(lengths)} lines).")
+        return True
+
+    def toggle_layout(self):
+        self.layout = Constants.OVERLAY_LAYOUT if self.layout == Constants.GRID_LAYOUT else Constants.GRID_LAYOUT
+        self.invalidate_canvases()
+        print(f"Compared systems are now shown in a {self.layout} layout.")
+
+    def toggle_joint(self, idx):
+        # The joint is column idx + 1 of the engine positions
+        if idx >= len(self.joint_enabled):
+            return
+        self.joint_enabled[idx] = not self.joint_enabled[idx]
+        with self.simulation_lock:
+            if self.joint_enabled[idx]:
+                self.joint_traces[idx] = PositionTrace(self.trace_times, self.engine, idx + 1)
+            else:
+                del self.joint_traces[idx]
+        self.invalidate_canvases()
+        self.drawn_view_state = None
+        state = "shown" if self.joint_enabled[idx] else "hidden"
+        print(f"Trace of joint {idx + 1} is now {state}.")
+
+    def set_fading_trail(self, enabled):
+        # In fading-trail mode no trace history is kept at all; the trace starts afresh
+        # from the current time in both directions. The timeline lock keeps a simulation
+        # tick on the worker from switching modes halfway through.
+        with self.timeline_lock, self.simulation_lock:
+            if enabled:
+                self.fading_trail = FadingTrail(self.screen.get_size())
+                self.fading_trail.profiler = self.profiler
+            else:
+                self.fading_trail = None
+            self.trace_times = SampleTimes(self.trace_capacity)
+            self.create_traces()
+            self.trace_end_time = None
+            self.trace_frozen = False
+            self.invalidate_canvases(reset=True)
+        self.drawn_view_state = None
+        print(f"Fading trails {'on' if enabled else 'off'}.")
+
+    def stop_simulation_worker(self):
+        if self.simulation_worker is not None:
+            self.simulation_worker.stop()
+            self.simulation_worker = None
+
+    def import_configuration(self, path):
+        # Load a JSON or CSV configuration straight into the lists and start the visualization
+        try:
+            lengths, speeds, phases, joints = load_config(path)
+        except (OSError, ConfigError) as error:
+            print(f"Could not load configuration: {error}")
+            return False
+        self.config_path = path
+        return self.load_configuration(lengths, speeds, joints, phases)
+
+    def export_configuration(self, path):
+        joints = list(zip(self.joint_enabled, self.joint_color_texts))
+        try:
+            save_config(path, self.lengths, self.speeds, self.phases, joints)
+        except OSError as error:
+            print(f"Could not export configuration: {error}")
+            return False
+        print(f"Configuration of {len(self.lengths)} lines exported to {path}.")
+        return True
+
+    def save_session(self, path):
+        # Store the configuration, view and traces so the visualization can be resumed later
+        state = {
+            'lengths': self.lengths,
+            'speeds': self.speeds,
+            'phases': self.phases,
+            'joints': [{'enabled': enabled, 'color': color}
+                       for enabled, color in zip(self.joint_enabled, self.joint_color_texts)],
+            'time': self.time,
+            'scale': self.scale,
+            'view_offset': [self.view_offset.x, self.view_offset.y],
+            'speed_multiplier': self.speed_multiplier,
+            'trace_end_time': self.trace_end_time,
+            'trace_frozen': self.trace_frozen,
+        }
+        with self.simulation_lock:
+            save_session(path, state, self.trace_times)
+        print(f"Session saved to {path}.")
+
+    def load_session(self, path):
+        # Resume a saved visualization; the traces are memory-mapped rather than read
+        try:
+            state, samples = load_session(path)
+        except (OSError, ValueError, KeyError) as error:
+            print(f"Could not load session {path}: {error}")
+            return False
+        joints = [(joint['enabled'], joint['color']) for joint in state['joints']]
+        if not self.load_configuration(state['lengths'], state['speeds'], joints, state.get('phases')):
+            return False
+        self.stop_simulation_worker()  # Restarted once the saved state is in place
+        self.trace_times = samples
+        self.create_traces()
+        self.time = state['time']
+        self.furthest_time = self.time
+        self.scale = state['scale']
+        self.view_offset = pygame.Vector2(state['view_offset'])
+        self.speed_multiplier = state['speed_multiplier']
+        self.trace_end_time = state['trace_end_time']
+        self.trace_frozen = state['trace_frozen']
+        self.invalidate_canvases()
+        self.drawn_view_state = None
+        if self.threaded_simulation:
+            self.simulation_worker = SimulationWorker(self)
+            self.simulation_worker.start()
+        print(f"Session loaded from {path}: {self.trace_times.total} trace points at time {self.time:.2f}.")
+        return True
 
     def handle_input_events(self, event):
-        for item in self.input_boxes:
-            if item[0] == "input":
-                box = item[1]
-                box.handle_event(event)
-            elif item[0] == "joint_checkbox":
-                checkbox = item[1]
-                checkbox.handle_event(event)
-            elif item[0] == "joint_color":
-                color_input = item[1]
-                color_input.handle_event(event)
-        for button in self.buttons:
-            button.handle_event(event)
+        # Events only go to the widgets they can affect: clicks to the widget under the
+        # mouse (and the focused box, which loses focus), keys to the focused box, and
+        # mouse motion to the widgets the mouse enters or leaves
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            if event.button in (4, 5):  # Mouse wheel scrolls the lines
+                if self.list_rect.collidepoint(event.pos):
+                    self.scroll_lines(-1 if event.button == 4 else 1)
+                return
+            hit = self.hit_index.at(event.pos)
+            if hit in self.row_widgets and not self.list_rect.collidepoint(event.pos):
+                hit = None  # Scrolled out of the list area
+            if self.focused_box is not None and self.focused_box is not hit:
+                self.focused_box.handle_event(event)
+                self.focused_box = None
+            if hit is not None:
+                hit.handle_event(event)
+                if isinstance(hit, InputBox) and hit.active:
+                    self.focused_box = hit
+                if hit in self.row_widgets:
+                    self.store_widget_value(hit)
+        elif event.type == pygame.KEYDOWN:
+            if self.focused_box is not None:
+                self.focused_box.handle_event(event)
+                self.store_widget_value(self.focused_box)
+                if not self.focused_box.active:
+                    self.focused_box = None
+            elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                page = len(self.rows) - 1
+                self.scroll_lines(-page if event.key == pygame.K_PAGEUP else page)
+            elif event.key in (pygame.K_HOME, pygame.K_END):
+                self.scroll_lines(-len(self.length_texts) if event.key == pygame.K_HOME else len(self.length_texts))
+        elif event.type == pygame.MOUSEMOTION:
+            hit = self.hit_index.at(event.pos)
+            if hit is not self.hovered_widget:
+                for widget in (self.hovered_widget, hit):
+                    if widget is not None:
+                        widget.handle_event(event)
+                self.hovered_widget = hit
+        elif event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.WINDOWSIZECHANGED):
+            self.input_needs_full_redraw = True
 
     def draw_input_screen(self):
+        # Returns the screen areas that changed
+        if not self.input_needs_full_redraw:
+            dirty_rects = []
+            for widget in self.hit_index.widgets:
+                if widget.dirty:
+                    bounds = widget.get_bounds()
+                    dirty_rects.append(bounds.clip(self.list_rect) if widget in self.row_widgets else bounds)
+            if not dirty_rects:
+                return dirty_rects
+            for rect in dirty_rects:
+                # Clear the area and draw every widget overlapping it, clipped to it
+                self.screen.set_clip(rect)
+                self.screen.fill(Constants.BLACK)
+                for widget in self.hit_index.widgets:
+                    if widget.get_bounds().colliderect(rect):
+                        widget.draw(self.screen)
+            self.screen.set_clip(None)
+            for widget in self.hit_index.widgets:
+                widget.dirty = False
+            return dirty_rects
+
+        self.input_needs_full_redraw = False
         self.screen.fill(Constants.BLACK)
         # Title
-        title_font = pygame.font.SysFont(None, Constants.BUTTON_FONT_SIZE)
-        title_surf = title_font.render("Configure Rotating Lines", True, Constants.WHITE)
+        title_surf = render_text("Configure Rotating Lines", Constants.BUTTON_FONT_SIZE, Constants.WHITE)
         self.screen.blit(title_surf, (Constants.WIDTH // 2 - title_surf.get_width() // 2, 10))
 
-        # Draw input boxes, labels, checkboxes, and color inputs
-        for item in self.input_boxes:
-            if item[0] == "label":
-                label_surf, label_rect = item[1], item[2]
-                self.screen.blit(label_surf, label_rect)
-            elif item[0] == "input":
-                box = item[1]
-                if isinstance(box, InputBox):
-                    box.draw(self.screen)
-                else:
-                    print(f"Error: Expected InputBox instance, got {type(box)}")
-            elif item[0] == "joint_checkbox":
-                checkbox = item[1]
-                checkbox.draw(self.screen)
-            elif item[0] == "joint_color":
-                color_input = item[1]
-                color_input.draw(self.screen)
+        # Draw the labels, input boxes, checkboxes and color inputs of the rows in use
+        self.screen.set_clip(self.list_rect)
+        for row in self.rows:
+            if row['line'] is None:
+                continue
+            line_label = render_text(f"Line {row['line'] + 1}:", Constants.FONT_SIZE, Constants.WHITE)
+            self.screen.blit(line_label, (Constants.WIDTH // 2 - 300, row['y'] + 8))
+        for widget in self.hit_index.widgets:
+            if widget in self.row_widgets:
+                widget.draw(self.screen)
+        self.screen.set_clip(None)
+
+        # Scroll position, only once the lines don't fit
+        line_count = len(self.length_texts)
+        if line_count > len(self.rows):
+            last_line = min(self.first_line + len(self.rows), line_count)
+            footer = f"Lines {self.first_line + 1}-{last_line} of {line_count} (Mouse wheel, Page Up/Down, Home/End: Scroll)"
+            footer_surf = render_text(footer, Constants.FONT_SIZE, Constants.FAINT_WHITE)
+            self.screen.blit(footer_surf, (Constants.WIDTH // 2 - footer_surf.get_width() // 2, self.list_rect.bottom + 6))
+            bar_height = max(self.list_rect.height * len(self.rows) // line_count, 10)
+            bar_y = self.list_rect.top + (self.list_rect.height - bar_height) * self.first_line // (line_count - len(self.rows))
+            pygame.draw.rect(self.screen, Constants.GRAY, (Constants.WIDTH - 12, bar_y, 6, bar_height))
 
         # Draw buttons
         for button in self.buttons:
             button.draw(self.screen)
 
+        for widget in self.hit_index.widgets:
+            widget.dirty = False
+        return [self.screen.get_rect()]
+
     def handle_visualize_events(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_p:
                 self.paused = not self.paused
+            elif event.key == pygame.K_g:  # 'G' key to show compared systems side by side or overlaid
+                self.toggle_layout()
+            elif event.key == pygame.K_t:  # 'T' key to switch between fading trails and the full trace
+                self.set_fading_trail(self.fading_trail is None)
+            elif event.key == pygame.K_r:  # 'R' key to play backwards or forwards
+                self.reverse = not self.reverse
+                print(f"Playing {'backwards' if self.reverse else 'forwards'}.")
+            elif event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):  # '[' ']' keys to seek
+                # A second of playback, a minute with Shift or an hour with Ctrl
+                frames = self.seek_step
+                if event.mod & pygame.KMOD_SHIFT:
+                    frames *= 60
+                if event.mod & pygame.KMOD_CTRL:
+                    frames *= 3600
+                direction = -1 if event.key == pygame.K_LEFTBRACKET else 1
+                self.seek(self.time + direction * frames * self.speed_multiplier)
+            elif event.key == pygame.K_HOME:  # 'Home' key to seek back to the start
+                self.seek(0)
             elif event.key == pygame.K_ESCAPE:
                 # Abort visualization and return to input mode
+                self.stop_simulation_worker()
+                if self.session_path:
+                    self.save_session(self.session_path)
                 self.mode = Constants.INPUT_MODE
                 self.initialize_input_screen()
             elif event.key == pygame.K_COMMA:  # '<' key (comma key on some keyboards)
@@ -345,6 +705,10 @@ class VisualizationApp:
                 self.increase_speed()
             elif event.key == pygame.K_h:  # 'H' key to hide/show lines, joints, and texts
                 self.toggle_hide()
+            elif event.key == pygame.K_f:  # 'F' key to show/hide the frame profiler overlay
+                self.profiler.toggle_overlay()
+            elif event.key == pygame.K_c:  # 'C' key to export the configuration
+                self.export_configuration(self.config_path)
             elif event.key in (pygame.K_PLUS, pygame.K_EQUALS):  # '+' key
                 self.zoom_in()
             elif event.key == pygame.K_MINUS:  # '-' key
@@ -359,11 +723,21 @@ class VisualizationApp:
                 self.pan(pygame.Vector2(-self.pan_speed, 0))
             elif event.key == pygame.K_0:  # '0' key - Reset Zoom and Pan
                 self.reset_view()
+            elif pygame.K_1 <= event.key <= pygame.K_9:  # Number keys show/hide the trace of that joint
+                self.toggle_joint(event.key - pygame.K_1)
         elif event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 4:  # Mouse wheel up
                 self.zoom_in()
             elif event.button == 5:  # Mouse wheel down
                 self.zoom_out()
+            elif event.button == 1 and not self.hidden and self.timeline_rect.inflate(0, 16).collidepoint(event.pos):
+                # Drag the timeline slider to scrub; the simulation holds still meanwhile
+                self.scrubbing = True
+                self.seek(self.timeline_time(event.pos[0]))
+        elif event.type == pygame.MOUSEMOTION and self.scrubbing:
+            self.seek(self.timeline_time(event.pos[0]))
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.scrubbing = False
 
     def pan(self, direction: pygame.Vector2):
         # Update the view offset
@@ -376,12 +750,14 @@ class VisualizationApp:
         # Clamp the view_offset to stay within the allowed boundaries
         self.view_offset.x = max(-max_offset_x, min(self.view_offset.x, max_offset_x))
         self.view_offset.y = max(-max_offset_y, min(self.view_offset.y, max_offset_y))
+        self.invalidate_canvases()
 
         print(f"Panned to offset: ({self.view_offset.x}, {self.view_offset.y})")
 
     def reset_view(self):
         self.scale = 1.0
         self.view_offset = pygame.Vector2(0, 0)
+        self.invalidate_canvases()
         print("View reset to default.")
         self.trigger_speed_flash()
 
@@ -412,8 +788,7 @@ class VisualizationApp:
             self.flashing_text_active = True
             # Render the text with speed, zoom, and panning information
             text = f"Speed: {self.speed_multiplier:.2f}x | Zoom: {self.scale:.1f}x | Pan: ({int(self.view_offset.x)}, {int(self.view_offset.y)})"
-            font = pygame.font.SysFont(None, Constants.FONT_SIZE)
-            text_surface = font.render(text, True, Constants.WHITE)
+            text_surface = render_text(text, Constants.FONT_SIZE, Constants.WHITE)
             # Create a surface with per-pixel alpha
             self.flashing_text_surface = text_surface.convert_alpha()
             self.flashing_text_rect = self.flashing_text_surface.get_rect()
@@ -423,75 +798,189 @@ class VisualizationApp:
     def zoom_in(self):
         if self.scale < self.max_scale:
             self.scale += self.zoom_step
+            self.invalidate_canvases()
             print(f"Zoomed In. Current scale: {self.scale:.1f}x")
             self.trigger_speed_flash()
 
     def zoom_out(self):
         if self.scale > self.min_scale:
             self.scale -= self.zoom_step
+            self.invalidate_canvases()
             print(f"Zoomed Out. Current scale: {self.scale:.1f}x")
             self.trigger_speed_flash()
 
+    def to_screen(self, points):
+        # Apply scaling and panning to an (n, 2) array of points relative to center
+        origin = (Constants.CENTER[0] + self.view_offset.x, Constants.CENTER[1] + self.view_offset.y)
+        return (points * self.scale + origin).tolist()
+
+    def get_viewport(self):
+        # Visible area in trace coordinates (min x, min y, max x, max y), one pixel larger for anti-aliasing
+        width, height = self.screen.get_size()
+        origin_x = Constants.CENTER[0] + self.view_offset.x
+        origin_y = Constants.CENTER[1] + self.view_offset.y
+        return ((-1 - origin_x) / self.scale, (-1 - origin_y) / self.scale,
+                (width + 1 - origin_x) / self.scale, (height + 1 - origin_y) / self.scale)
+
+    def get_trace_layers(self, systems=None):
+        # Traces of the enabled joints first, then the trace of the last endpoint, per system
+        layers = []
+        for system in self.systems() if systems is None else systems:
+            joint_traces = system['joint_traces']
+            layers.extend((joint_traces[idx], system['joint_colors'][idx]) for idx in sorted(joint_traces))
+            layers.append((system['trace_points'], system['color']))
+        return layers
+
+    def grid_cells(self):
+        # Screen rectangle of every system in the grid layout, in rows of up to columns cells
+        count = 1 + len(self.compared_configs)
+        columns = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+        width, height = self.screen.get_width() // columns, self.screen.get_height() // rows
+        return [pygame.Rect(number % columns * width, number // columns * height, width, height)
+                for number in range(count)]
+
+    def grid_shown(self):
+        # Fading trails are always overlaid, as they are drawn onto a single surface
+        return bool(self.grid_canvases) and self.layout == Constants.GRID_LAYOUT and self.fading_trail is None
+
+    def draw_arms(self, positions, lengths, origin, scale):
+        # positions is one row of EpicycleBatch.positions_at (relative to center) and lengths the
+        # lengths of its arms; origin is the screen position of the center, as a complex number
+        screen_positions = origin + positions[:len(lengths) + 1] * scale
+        arm_count = len(screen_positions) - 1
+        if arm_count == 0:
+            return
+
+        # Skip sub-pixel arms, but keep a vertex whenever the skipped arms add up to
+        # another pixel so the chain never drifts from the true endpoint
+        arm_pixels = np.abs(lengths) * scale
+        visible = arm_pixels >= Constants.MIN_ARM_PIXELS
+        skipped_pixels = np.floor(np.cumsum(np.where(visible, 0, arm_pixels)) / Constants.MIN_ARM_PIXELS)
+        keep = np.ones(arm_count + 1, dtype=bool)
+        keep[1:] = visible | (np.diff(skipped_pixels, prepend=0) > 0)
+        keep[-1] = True  # Always end at the endpoint
+        vertices = screen_positions[keep]
+        points = list(zip(vertices.real.tolist(), vertices.imag.tolist()))
+
+        # The whole chain is one anti-aliased polyline
+        if len(points) > 1:
+            pygame.draw.aalines(self.screen, Constants.WHITE, False, points, 1)
+
+        # Joints sit between lines, on the end of a visible line
+        joints = screen_positions[1:-1][visible[:-1]]
+        if len(joints):
+            corners = zip((joints.real.astype(int) - 3).tolist(), (joints.imag.astype(int) - 3).tolist())
+            self.screen.blits([(self.joint_sprite, corner) for corner in corners], doreturn=False)
+
+    def view_state(self):
+        # Everything the composed visualization frame depends on besides the traces, which
+        # only change along with the time. The arms are not drawn while hidden, so the time
+        # only matters then if the trace is still growing.
+        time = None if self.hidden and self.trace_frozen and self.fading_trail is None else self.time
+        return (time, self.scale, self.view_offset.x, self.view_offset.y, self.hidden, self.paused, self.reverse,
+                self.layout, self.profiler.overlay_visible)
+
+    def visualization_animating(self):
+        # Whether the next frame differs from the last one even if nothing else changes
+        return self.flashing_text_active or self.profiler.overlay_visible
+
+    def visualization_idle(self):
+        # Nothing will change on screen before the next event: paused with the last frame
+        # still up to date
+        return self.paused and not self.visualization_animating() and self.drawn_view_state == self.view_state()
+
+    def draw_timeline(self):
+        # Slider from time 0 to timeline_end(), with the current time above its left end
+        pygame.draw.rect(self.screen, Constants.GRAY, self.timeline_rect)
+        fraction = min(self.time / self.timeline_end(), 1.0)
+        filled = self.timeline_rect.copy()
+        filled.width = round(self.timeline_rect.width * fraction)
+        pygame.draw.rect(self.screen, Constants.FAINT_WHITE, filled)
+        pygame.draw.circle(self.screen, Constants.WHITE, (filled.right, self.timeline_rect.centery), 6)
+        direction = " (reverse)" if self.reverse else ""
+        text = f"Time: {self.time:.2f} / {self.timeline_end():.2f}{direction}"
+        # Changes every frame, so it is rendered directly rather than filling the text cache
+        time_surf = get_font(Constants.FONT_SIZE).render(text, True, Constants.FAINT_WHITE)
+        self.screen.blit(time_surf, (self.timeline_rect.left, self.timeline_rect.top - time_surf.get_height() - 6))
+
+    def draw_overlay(self):
+        # Clear the screen with the cached traces; only new segments are drawn onto the cache
+        with self.simulation_lock:
+            origin = (Constants.CENTER[0] + self.view_offset.x, Constants.CENTER[1] + self.view_offset.y)
+            if self.fading_trail is not None:
+                layers = []
+                for number, system in enumerate(self.systems()):
+                    layers.extend(((number, idx), system['joint_colors'][idx]) for idx in sorted(system['joint_traces']))
+                    layers.append(((number, 'endpoint'), system['color']))
+                self.fading_trail.update(layers, self.to_screen, self.scale, origin)
+                surface = self.fading_trail.surface
+            else:
+                self.trace_canvas.update(self.get_trace_layers(), self.to_screen, self.scale, self.get_viewport(), origin)
+                surface = self.trace_canvas.surface
+        self.screen.blit(surface, (0, 0))
+        self.profiler.lap('traces')
+
+        if not self.hidden:
+            # Draw the lines and joints only if not hidden, all systems from one batched evaluation
+            positions = self.batch.positions_at(self.time)
+            for row, engine in zip(positions, self.batch.engines):
+                self.draw_arms(row, engine.lengths, complex(*origin), self.scale)
+            self.profiler.lap('arms')
+
+    def draw_grid(self):
+        # Every system in its own cell, scaled down to fit it, with its own trace surface
+        cells = self.grid_cells()
+        systems = self.systems()
+        fit = min(cells[0].width / self.screen.get_width(), cells[0].height / self.screen.get_height())
+        scale = self.scale * fit
+        with self.simulation_lock:
+            for cell, system, canvas in zip(cells, systems, self.grid_canvases):
+                origin = (cell.width / 2 + self.view_offset.x * fit, cell.height / 2 + self.view_offset.y * fit)
+                viewport = ((-1 - origin[0]) / scale, (-1 - origin[1]) / scale,
+                            (cell.width + 1 - origin[0]) / scale, (cell.height + 1 - origin[1]) / scale)
+                to_screen = lambda points, origin=origin: (points * scale + origin).tolist()
+                canvas.update(self.get_trace_layers([system]), to_screen, scale, viewport)
+                self.screen.blit(canvas.surface, cell)
+        self.profiler.lap('traces')
+
+        if not self.hidden:
+            positions = self.batch.positions_at(self.time)
+            for cell, system, row in zip(cells, systems, positions):
+                self.screen.set_clip(cell)
+                origin = complex(cell.centerx + self.view_offset.x * fit, cell.centery + self.view_offset.y * fit)
+                self.draw_arms(row, system['engine'].lengths, origin, scale)
+                pygame.draw.rect(self.screen, Constants.GRAY, cell, 1)
+                if system['name']:
+                    name_surf = render_text(system['name'], Constants.FONT_SIZE, system['color'])
+                    self.screen.blit(name_surf, (cell.left + 6, cell.top + 6))
+            self.screen.set_clip(None)
+            self.profiler.lap('arms')
+
     def draw_visualization_screen(self):
-        # Clear the screen to hide input elements
-        self.screen.fill(Constants.BLACK)
-        
-        # Draw the traces of the joints
-        for idx, joint_trace in enumerate(self.joint_traces):
-            if len(joint_trace) > 1:
-                color = self.joints[idx]['color_input'].get_color()
-                if color is None:
-                    color = Constants.WHITE  # Default color if invalid
-                # Apply scaling and panning to joint trace points
-                scaled_panned_trace = [(
-                    Constants.CENTER[0] + (point[0] * self.scale) + self.view_offset.x,
-                    Constants.CENTER[1] + (point[1] * self.scale) + self.view_offset.y
-                ) for point in joint_trace]
-                pygame.draw.aalines(self.screen, color, False, scaled_panned_trace, 1)  # Thickness 1
-
-        # Draw the trace of the last endpoint
-        if len(self.trace_points) > 1:
-            scaled_panned_trace_points = [(
-                Constants.CENTER[0] + (point[0] * self.scale) + self.view_offset.x,
-                Constants.CENTER[1] + (point[1] * self.scale) + self.view_offset.y
-            ) for point in self.trace_points]
-            pygame.draw.aalines(self.screen, Constants.DRAW_COLOR, False, scaled_panned_trace_points, 1)
-
-        # Calculate positions with scaling and panning (relative to center)
-        positions = [(
-            Constants.CENTER[0] + self.view_offset.x,
-            Constants.CENTER[1] + self.view_offset.y
-        )]
-        for i in range(len(self.lengths)):
-            angle = self.speeds[i] * self.time  # Calculate angle based on time
-            length = self.lengths[i] * self.scale  # Scale the length
-            x = positions[i][0] + length * math.cos(angle)
-            y = positions[i][1] + length * math.sin(angle)
-            positions.append((x, y))
+        if self.grid_shown():
+            self.draw_grid()
+        else:
+            self.draw_overlay()
 
         if not self.hidden:
-            # Draw the lines and joints only if not hidden
-            for i in range(len(self.lengths)):
-                # Use anti-aliased lines
-                pygame.draw.aaline(self.screen, Constants.WHITE, positions[i], positions[i + 1], 1)
-                if i < len(self.lengths) - 1:
-                    # Apply scaling and panning to joint positions
-                    joint_pos = (
-                        int(positions[i + 1][0]),
-                        int(positions[i + 1][1])
-                    )
-                    pygame.draw.circle(self.screen, Constants.LIGHT_BLUE, joint_pos, 3)  # Smaller radius for smoothness
-
-            # Draw faint control label at bottom right
-            control_text = "P: Pause/Resume, Esc: Abort, < >: Adjust speed, H: Hide/show UI, WASD: Move/Pan, 0: Reset Zoom/Pan, + -: Zoom"
-            control_font = pygame.font.SysFont(None, Constants.FONT_SIZE)
-            control_surf = control_font.render(control_text, True, Constants.FAINT_WHITE)
-            self.screen.blit(control_surf, (Constants.WIDTH - control_surf.get_width() - 10, Constants.HEIGHT - control_surf.get_height() - 10))
+
+            # Draw faint control labels at bottom right
+            control_texts = [
+                "P: Pause/Resume, R: Reverse, [ ]: Seek (Shift: x60, Ctrl: x3600), Home: Start, Esc: Abort, < >: Adjust speed, G: Grid/overlay",
+                "H: Hide/show UI, F: Profiler, C: Export config, T: Fading trails, WASD: Move/Pan, 0: Reset Zoom/Pan, 1-9: Joint traces, + -: Zoom",
+            ]
+            y = Constants.HEIGHT - 10
+            for control_text in reversed(control_texts):
+                control_surf = render_text(control_text, Constants.FONT_SIZE, Constants.FAINT_WHITE)
+                y -= control_surf.get_height()
+                self.screen.blit(control_surf, (Constants.WIDTH - control_surf.get_width() - 10, y))
+
+            self.draw_timeline()
 
             # If paused, display 'Paused' text
             if self.paused:
-                paused_font = pygame.font.SysFont(None, Constants.BUTTON_FONT_SIZE)
-                paused_surf = paused_font.render("Paused", True, Constants.RED)
+                paused_surf = render_text("Paused", Constants.BUTTON_FONT_SIZE, Constants.RED)
                 self.screen.blit(paused_surf, (Constants.WIDTH // 2 - paused_surf.get_width() // 2, 10))
 
         # Handle flashing text
@@ -505,60 +994,214 @@ class VisualizationApp:
                 self.screen.blit(self.flashing_text_surface, self.flashing_text_rect)
             else:
                 self.flashing_text_active = False
+        self.profiler.lap('text')
 
     def update_visualization(self):
-        if not self.paused:
-            # Calculate total time to advance this frame
-            total_delta_time = self.speed_multiplier
-            remaining_time = total_delta_time
-
-            # Determine the maximum allowable time step
-            max_speed = max(abs(speed) for speed in self.speeds)
-            if max_speed != 0:
-                max_delta_time = self.max_angular_increment / max_speed
+        if self.simulation_worker is not None:
+            return  # The worker advances the simulation at its own rate
+        self.tick_simulation()
+
+    def tick_simulation(self):
+        # Move by one frame worth of time, backwards when playing in reverse
+        if self.paused or self.scrubbing:
+            return
+        with self.timeline_lock:
+            if self.reverse and self.time <= 0:
+                self.paused = True
+                print("Reached the start of the timeline. Paused.")
+            elif self.fading_trail is not None:
+                self.advance_trail(max(-self.speed_multiplier, -self.time) if self.reverse else self.speed_multiplier)
+            elif self.reverse:
+                self.seek(self.time - self.speed_multiplier)
+            else:
+                self.advance_simulation(self.speed_multiplier, prefetch=True)
+
+    def seek(self, time):
+        # Jump straight to time without replaying the frames in between. The arms are
+        # evaluated at time directly; the trace is cut back to it, or the missing samples
+        # are computed in batches of up to max_substeps.
+        time = max(float(time), 0.0)
+        with self.timeline_lock:
+            if self.fading_trail is not None:
+                # Nothing is stored to cut back or fill in, so the trail starts over at time
+                with self.simulation_lock:
+                    self.fading_trail.clear()
+                self.time = time
+                self.furthest_time = max(self.furthest_time, time)
+                return
+            if time < self.time:
+                self.truncate_trace(time)
+                self.time = time
+            max_delta_time = self.batch.max_delta_time(self.max_pixel_error, self.scale, time - self.time)
+            batch = self.max_substeps * max_delta_time
+            while time - self.time > 1e-9 * max(time, 1.0):
+                if self.trace_frozen:
+                    self.time = time  # Nothing left to trace, only the arms move
+                    break
+                self.advance_simulation(min(batch, time - self.time))
+
+    def advance_trail(self, total_delta_time):
+        # Fading-trail counterpart of advance_simulation: the new segments go straight to
+        # the trail, backwards when total_delta_time is negative, and nothing is stored
+        max_delta_time = self.batch.max_delta_time(self.max_pixel_error, self.scale, abs(total_delta_time))
+        offsets = substep_times(0.0, abs(total_delta_time), max_delta_time, self.max_substeps)
+        self.profiler.count('substeps', len(offsets))
+        if len(offsets) == 0:
+            return
+        times = self.time + np.copysign(offsets, total_delta_time)
+        self.time = float(times[-1])
+        self.furthest_time = max(self.furthest_time, self.time)
+        # The endpoints of every system in one batch; joints only where they are traced
+        endpoints = self.batch.endpoints(times)  # Relative to center
+        with self.simulation_lock:
+            for number, system in enumerate(self.systems()):
+                if system['joint_traces']:
+                    positions = system['engine'].positions(times)
+                    for idx in system['joint_traces']:
+                        self.fading_trail.add((number, idx), np.column_stack((positions[:, idx + 1].real,
+                                                                              positions[:, idx + 1].imag)))
+                self.fading_trail.add((number, 'endpoint'), np.column_stack((endpoints[:, number].real,
+                                                                            endpoints[:, number].imag)))
+
+    def truncate_trace(self, time):
+        # Drops the samples after time from the trace, which then grows again from there.
+        # The canvases only take back the removed segments (see TraceCanvas.truncate), so
+        # this stays cheap when called every frame while playing backwards or scrubbing.
+        with self.simulation_lock:
+            removed_times = self.trace_times.truncate(time)
+            if len(removed_times):
+                boxes = [trace.truncate(removed_times) for system in self.systems()
+                         for trace in [system['trace_points'], *system['joint_traces'].values()]]
+                bounds = None
+                if all(box is not None for box in boxes):
+                    bounds = (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                              max(box[2] for box in boxes), max(box[3] for box in boxes))
+                for canvas in [self.trace_canvas, *self.grid_canvases]:
+                    canvas.truncate(bounds)
+            if self.trace_times.total == 0:
+                self.trace_end_time = None  # Measured again from the next first sample
+            self.trace_frozen = self.trace_end_time is not None and time >= self.trace_end_time
+
+    def timeline_time(self, x):
+        # Time at screen position x on the timeline slider
+        fraction = (x - self.timeline_rect.left) / self.timeline_rect.width
+        return min(max(fraction, 0.0), 1.0) * self.timeline_end()
+
+    def timeline_end(self):
+        # The slider spans the closed curve if there is one, and always the latest time reached
+        return max(self.furthest_time, self.time, self.trace_end_time or 0.0, 1.0)
+
+    def advance_simulation(self, total_delta_time, prefetch=False):
+        # prefetch also computes the new points of the traces being drawn, so that with the
+        # simulation on the worker thread the render thread only draws them
+        # Determine the maximum allowable time step
+        max_delta_time = self.batch.max_delta_time(self.max_pixel_error, self.scale, total_delta_time)
+
+        # Subdivide the time step and evaluate every sub-step in one batch
+        times = substep_times(self.time, total_delta_time, max_delta_time, self.max_substeps)
+        self.profiler.count('substeps', len(times))
+        if len(times) == 0:
+            return
+        self.time = float(times[-1])
+        self.furthest_time = max(self.furthest_time, self.time)
+        if self.trace_frozen:
+            return  # The closed curve is already fully traced
+
+        if self.trace_end_time is None and self.period is not None:
+            # The curve repeats one full period after the first traced sample
+            self.trace_end_time = float(times[0]) + self.period
+        if self.trace_end_time is not None and times[-1] >= self.trace_end_time:
+            # Trace up to exactly one period so the curve closes, then stop growing
+            closing = np.append(times[times < self.trace_end_time], self.trace_end_time)
+            if self.trace_times.first_index() > 0 or len(self.trace_times) + len(closing) > self.trace_times.capacity:
+                # The trace can't hold a whole period, so the start of the curve is already
+                # (or about to be) dropped and a frozen trace would stay incomplete: treat
+                # the curve as one that never closes
+                print(f"One period ({self.period:.2f} time units) needs more trace points than the trace holds. "
+                      f"Tracing continues.")
+                self.period = None
+                self.trace_end_time = None
             else:
-                max_delta_time = total_delta_time  # No need to sub-step if all speeds are zero
-
-            # Subdivide the time step if necessary
-            while remaining_time > 0:
-                delta_time = min(remaining_time, max_delta_time)
-                self.time += delta_time
-                remaining_time -= delta_time
-
-                # Calculate positions for this sub-step (relative to center)
-                positions = [(0, 0)]  # Start at origin (center)
-                for i in range(len(self.lengths)):
-                    angle = self.speeds[i] * self.time
-                    length = self.lengths[i]
-                    x = positions[i][0] + length * math.cos(angle)
-                    y = positions[i][1] + length * math.sin(angle)
-                    positions.append((x, y))
-
-                # Store the position of the last endpoint (relative to center)
-                self.trace_points.append(positions[-1])
-
-                # Store the positions of the enabled joints (relative to center)
-                for idx, joint in enumerate(self.joints):
-                    if joint['checkbox'].is_checked():
-                        # The position of the joint is positions[idx + 1]
-                        self.joint_traces[idx].append(positions[idx + 1])
+                times = closing
+                self.trace_frozen = True
+                print(f"Curve closed after {self.period:.2f} time units. Trace frozen.")
+        positions = self.engine.positions(times) if self.exporter is not None else None  # Relative to center
+        tails = []
+        if prefetch:
+            with self.simulation_lock:
+                traces = [trace for trace, _ in self.get_trace_layers()]
+            tails = [(trace, trace.materialize(times[-trace.block_size:])) for trace in traces]
+
+        with self.simulation_lock:
+            if positions is not None:
+                # The exporter gets the points of the last endpoint and the enabled joints
+                first_index = self.trace_times.total
+                if first_index < self.exported_total:
+                    # The trace was cut back or started over since
+                    self.exporter.restart(first_index)
+                self.exported_total = first_index + len(times)
+                self.exporter.submit(0, first_index, times, positions[:, -1])
+                for idx in sorted(self.joint_traces):
+                    self.exporter.submit(idx + 1, first_index, times, positions[:, idx + 1])
+            # Only the times are stored; the traces compute their points when drawn, unless
+            # they were computed above
+            self.trace_times.extend(times)
+            for trace, points in tails:
+                trace.append_tail(points)
 
     def run(self, clock):
         while True:
-            for event in pygame.event.get():
+            self.profiler.start_frame()
+            events = pygame.event.get()
+            if not events and self.mode == Constants.INPUT_MODE and not self.input_needs_full_redraw:
+                # Nothing on the input screen changes without an event, so sleep until one arrives
+                events = [pygame.event.wait()]
+            elif not events and self.mode == Constants.VISUALIZE_MODE and self.visualization_idle():
+                # Likewise while the visualization is paused and its last frame is still on screen
+                events = [pygame.event.wait()]
+            for event in events:
                 if event.type == pygame.QUIT:
+                    self.stop_simulation_worker()
+                    if self.session_path and self.mode == Constants.VISUALIZE_MODE:
+                        self.save_session(self.session_path)
+                    self.profiler.close_log()
+                    if self.exporter is not None:
+                        self.exporter.close()
                     pygame.quit()
                     sys.exit()
+                if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    # The window contents were lost, so the last frame can't be reused
+                    self.input_needs_full_redraw = True
+                    self.drawn_view_state = None
                 if self.mode == Constants.INPUT_MODE:
                     self.handle_input_events(event)
                 elif self.mode == Constants.VISUALIZE_MODE:
                     self.handle_visualize_events(event)
+            self.profiler.lap('events')
 
+            dirty_rects = None  # Whole screen
             if self.mode == Constants.INPUT_MODE:
-                self.draw_input_screen()
+                if self.profiler.overlay_visible:
+                    self.input_needs_full_redraw = True  # The overlay is drawn over everything
+                dirty_rects = self.draw_input_screen()
+                self.profiler.lap('input')
             elif self.mode == Constants.VISUALIZE_MODE:
                 self.update_visualization()
-                self.draw_visualization_screen()
+                self.profiler.lap('update')
+                state = self.view_state()
+                if state != self.drawn_view_state or self.visualization_animating():
+                    self.draw_visualization_screen()
+                    self.drawn_view_state = state
+                else:
+                    dirty_rects = []  # The last frame is still on screen
+                self.profiler.count('trace_points', len(self.trace_times))
 
-            pygame.display.flip()
+            self.profiler.draw_overlay(self.screen)
+            self.profiler.lap('overlay')
+            if dirty_rects is None:
+                pygame.display.flip()
+            elif dirty_rects:
+                pygame.display.update(dirty_rects)
+            self.profiler.lap('flip')
+            self.profiler.end_frame()
             clock.tick(Constants.FPS)